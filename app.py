@@ -1,14 +1,28 @@
 import os
 import requests
-from flask import Flask, request
+from flask import Flask, request, jsonify, Response
 from dotenv import load_dotenv
 import urllib.parse
 from datetime import datetime
 from pymongo import MongoClient
-import re
 import google.generativeai as genai
 import certifi
 import time
+import threading
+import work_queue
+import knowledge_cache
+import knowledge_index
+import faq_matcher
+import response_cache
+import http_client
+import session_cache
+import db_indexes
+import streaming
+import prompt_builder
+import metrics
+import message_dedup
+import message_coalescer
+import order_pipeline
 
 # .env ফাইল থেকে Environment Variables লোড করার জন্য
 load_dotenv()
@@ -23,6 +37,12 @@ GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 MONGO_URI = os.getenv('MONGO_URI')
 TELEGRAM_USERNAME = os.getenv('TELEGRAM_USERNAME')
 CALLMEBOT_API_KEY = os.getenv('CALLMEBOT_API_KEY')
+# ওয়েবহুক ইভেন্ট ব্যাকগ্রাউন্ড worker-এ প্রসেস করা হবে কিনা
+ASYNC_WEBHOOK = os.getenv('ASYNC_WEBHOOK', '0') == '1'
+# চালুর সময় দরকারি ইনডেক্সগুলো তৈরি করা হবে কিনা
+AUTO_CREATE_INDEXES = os.getenv('AUTO_CREATE_INDEXES', '1') == '1'
+# Graph থ্রটলে গ্রাহকের উত্তর পাঠানোর থ্রেড সর্বোচ্চ এত সেকেন্ড অপেক্ষা করবে, এর বেশি হলে সাথে সাথে ব্যর্থ
+GRAPH_REPLY_MAX_WAIT = float(os.getenv('GRAPH_REPLY_MAX_WAIT', '1'))
 
 # --- ডেটাবেস কানেকশন ---
 try:
@@ -33,6 +53,11 @@ try:
     otn_tokens_collection = db.otn_tokens
     customer_details_collection = db.customer_details
     knowledge_collection = db.knowledge_base
+    webhook_queue_collection = db.webhook_queue
+    faq_collection = db.faq
+    response_cache_collection = db.response_cache
+    webhook_dedup_collection = db.webhook_dedup
+    orders_collection = db.orders
     print("MongoDB ডেটাবেসের সাথে সফলভাবে সংযুক্ত।")
 except Exception as e:
     print(f"MongoDB সংযোগে সমস্যা: {e}")
@@ -49,31 +74,51 @@ FAQ_RESPONSES = {
 # --- Gemini AI মডেল কনফিগার করা ---
 try:
     genai.configure(api_key=GEMINI_API_KEY)
-    model = genai.GenerativeModel('gemini-2.5-flash-lite') 
+    # স্থির ব্যক্তিত্ব/নির্দেশনা/উদাহরণ একবারই system instruction হিসেবে দেওয়া (PROMPT_SYSTEM_INSTRUCTION চালু থাকলে)
+    model = genai.GenerativeModel(prompt_builder.GEMINI_MODEL, **prompt_builder.model_options())
     print("Gemini AI মডেল (2.5 Flash-Lite) সফলভাবে লোড হয়েছে।")
 except Exception as e:
     print(f"Gemini AI কনফিগারেশনে সমস্যা হয়েছে: {e}")
     model = None
 
-GRAPH_API_URL = 'https://graph.facebook.com/v19.0/me/messages'
+# Graph API-র বেস URL (লোকাল বেঞ্চমার্কে নকল সার্ভারের দিকে ঘোরানো যায়)
+GRAPH_API_BASE = os.getenv('GRAPH_API_BASE', 'https://graph.facebook.com/v19.0')
+GRAPH_API_URL = f"{GRAPH_API_BASE}/me/messages"
 
-def get_full_knowledge_base():
-    if not client: return "কোনো তথ্য পাওয়া যায়নি।"
-    try:
-        all_docs = knowledge_collection.find({})
-        knowledge_text = "\n".join([f"- {doc.get('information', '')}" for doc in all_docs])
-        # সম্পূর্ণ মেন্যুটিও যোগ করা হচ্ছে
-        full_menu = """
-        সম্পূর্ণ মেন্যু লিস্ট:
-        ১) চিকেন রোল ১৫ পিসের প্যাক    ২২৫ টাকা
-        ২) ভেজিটেবল রোল ১৫ পিসের প্যাক ১৫০ টাকা
-        ৩) বিফ রোল ১০ পিসের প্যাক ২৫০ টাকা 
-        ... (আপনার সম্পূর্ণ মেন্যু এখানে থাকবে)
-        """
-        return full_menu + "\n\nঅন্যান্য তথ্য:\n" + knowledge_text
-    except Exception as e:
-        print(f"সম্পূর্ণ জ্ঞানভান্ডার আনতে সমস্যা: {e}")
-        return "কোনো তথ্য পাওয়া যায়নি।"
+# সম্পূর্ণ মেন্যু লিস্ট, জ্ঞানভান্ডারের শুরুতে যোগ করা হয় (prompt_builder-এ, যাতে টুলগুলো অ্যাপ চালু না করেই পায়)
+FULL_MENU = prompt_builder.FULL_MENU
+
+def get_knowledge_snapshot():
+    # প্রসেস-জুড়ে ক্যাশ করা জ্ঞানভান্ডার, version সহ
+    return knowledge_cache.get_snapshot()
+
+def get_knowledge_fingerprint():
+    # জ্ঞানভান্ডারের কনটেন্ট হ্যাশ; version প্রতি প্রসেসে আলাদা, হ্যাশ সব worker-এ একই
+    if not client:
+        return ''
+    snapshot = get_knowledge_snapshot()
+    return snapshot['content_hash'] if snapshot else ''
+
+knowledge_search_index = knowledge_index.KnowledgeIndex()
+
+def get_knowledge_entries(message, history=None):
+    # প্রম্পটে যাওয়া information গুলো, সবচেয়ে প্রাসঙ্গিকটি আগে
+    if not client:
+        return []
+    snapshot = get_knowledge_snapshot()
+    if not snapshot:
+        return []
+    all_entries = [doc.get('information', '') for doc in snapshot['docs']]
+    if knowledge_index.KNOWLEDGE_MODE == 'full':
+        return all_entries
+    knowledge_search_index.sync(snapshot['docs'], snapshot['version'])
+    # ছোট উত্তরের ("২ টা", "জ্বি") প্রসঙ্গ বোঝার জন্য গ্রাহকের আগের মেসেজগুলোও query-তে যোগ করা
+    recent_user_messages = [msg['content'] for msg in (history or []) if msg.get('role') == 'user'][-2:]
+    query = " ".join([message] + recent_user_messages)
+    hits = [information for information, _score in knowledge_search_index.search(query, knowledge_index.KNOWLEDGE_TOP_K)]
+    # কোনো মিল না পেলে (যেমন রোমান হরফে বাংলা: "delivery charge koto") আগের মতো পুরো জ্ঞানভান্ডার,
+    # প্রম্পট বিল্ডার বাজেট অনুযায়ী ছেঁটে নেবে
+    return hits or all_entries
 
 @app.route('/')
 def home():
@@ -88,113 +133,177 @@ def webhook():
             return 'ভেরিফিকেশন টোকেন ভুল', 403
     
     if request.method == 'POST':
-        data = request.get_json()
+        data = request.get_json(silent=True)
         if data and data.get('object') == 'page':
             for entry in data.get('entry', []):
                 for messaging_event in entry.get('messaging', []):
-                    sender_id = messaging_event['sender']['id']
-                    
-                    if messaging_event.get('optin'):
-                        # ... (OTN কোড)
+                    if not messaging_event.get('sender', {}).get('id'):
                         continue
-
-                    if messaging_event.get('message'):
-                        message_text = messaging_event['message'].get('text')
-                        if message_text:
-                            # --- নতুন এবং সরলীকৃত কার্যপ্রণালী ---
-                            lower_message = message_text.lower()
-                            is_faq = False
-                            for keywords, response in FAQ_RESPONSES.items():
-                                for keyword in keywords:
-                                    if re.search(r'\b' + re.escape(keyword) + r'\b', lower_message):
-                                        send_facebook_message(sender_id, response)
-                                        is_faq = True
-                                        break
-                                if is_faq: break
-                            
-                            if is_faq:
-                                continue
-
-                            # যদি FAQ না হয়, তবেই AI ব্যবহার করা
-                            save_message_to_db(sender_id, 'user', message_text)
-                            if model:
-                                try:
-                                    bot_response = get_gemini_response(sender_id, message_text)
-                                    save_message_to_db(sender_id, 'model', bot_response)
-                                    
-                                    user_facing_response = bot_response
-                                    
-                                    if "[ORDER_CONFIRMATION]" in bot_response:
-                                        bill_match = re.search(r'\[BILL:(\d+\.?\d*)\]', bot_response)
-                                        total_bill = bill_match.group(1) if bill_match else "মোট বিল"
-                                        
-                                        confirmation_message = f"ধন্যবাদ, আপনার মোট চার্জ {total_bill} টাকা।\nআপনি ১ থেকে ৩ দিনের মধ্যে প্রোডাক্টস পেয়ে যাবেন।\nদয়া করে কনফার্ম করার পর ক্যানসেল করিয়েন না, কারণ আমরা অর্ডার দেয়ার পর তৈরি করি।"
-                                        send_facebook_message(sender_id, confirmation_message)
-                                        
-                                        details_match = re.search(r'\[DETAILS:(.*?)\]', bot_response)
-                                        if details_match:
-                                            details_str = details_match.group(1)
-                                            save_customer_details(sender_id, details_str)
-                                        
-                                        send_otn_request(sender_id)
-                                    else:
-                                        send_facebook_message(sender_id, user_facing_response)
-
-                                except Exception as e:
-                                    print(f"Gemini থেকে উত্তর আনতে সমস্যা হয়েছে: {e}")
-                                    send_facebook_message(sender_id, "দুঃখিত, এই মুহূর্তে উত্তর দিতে পারছি না।")
+                    # Facebook টাইমআউটে একই মেসেজ আবার পাঠালে বাদ দেওয়া
+                    if message_dedup.is_duplicate((messaging_event.get('message') or {}).get('mid')):
+                        continue
+                    if message_coalescer.enabled():
+                        # পরপর আসা মেসেজগুলো একটু অপেক্ষা করে একটি টার্নে মেশানো, তারপর কিউতে
+                        message_coalescer.submit(messaging_event)
+                    elif ASYNC_WEBHOOK:
+                        # Facebook-কে সাথে সাথে 200 ফেরত দেওয়ার জন্য ইভেন্টটি কিউতে রাখা
+                        work_queue.enqueue_event(messaging_event)
+                    else:
+                        process_messaging_event(messaging_event)
         return 'Event received', 200
 
-def get_gemini_response(sender_id, message):
-    history = get_chat_history(sender_id, limit=6)
-    formatted_history = "\n".join([f"{msg['role']}: {msg['content']}" for msg in history])
+def collect_stats():
+    dedup_stats = message_dedup.get_stats()
+    coalescer_stats = message_coalescer.get_stats()
+    return {
+        'webhook_queue': work_queue.get_stats(),
+        'knowledge_cache': knowledge_cache.get_stats(),
+        'faq_matcher': faq_matcher.get_stats(),
+        'response_cache': response_cache.get_stats(),
+        'http_client': http_client.get_stats(),
+        'session_cache': session_cache.get_stats(),
+        'dedup': dedup_stats,
+        'coalescer': coalescer_stats,
+        'orders': order_pipeline.get_stats(),
+        # ডুপ্লিকেট বাদ আর মেসেজ মেশানোর ফলে যতগুলো টার্ন (Gemini কল ও উত্তর পাঠানো) বাঁচানো গেছে
+        'saved_turns': {
+            'duplicates': dedup_stats['dropped'],
+            'coalesced': coalescer_stats['turns_saved'],
+            'total': dedup_stats['dropped'] + coalescer_stats['turns_saved'],
+        },
+    }
+
+@app.route('/stats')
+def stats():
+    return jsonify(collect_stats()), 200
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(collect_stats()), mimetype='text/plain; version=0.0.4')
+
+def process_messaging_event(messaging_event):
+    # প্রতিটি ইভেন্টের ধাপভিত্তিক সময় ট্রেস হিসেবে লগ করা
+    message_id = (messaging_event.get('message') or {}).get('mid')
+    metrics.start_trace(messaging_event['sender']['id'], message_id)
+    outcome = 'error'
+    try:
+        outcome = handle_messaging_event(messaging_event)
+    finally:
+        metrics.end_trace(outcome or 'ignored')
+
+def handle_messaging_event(messaging_event):
+    sender_id = messaging_event['sender']['id']
+
+    if messaging_event.get('optin'):
+        # ... (OTN কোড)
+        return 'optin'
+
+    if messaging_event.get('message'):
+        message_text = messaging_event['message'].get('text')
+        if message_text:
+            # --- নতুন এবং সরলীকৃত কার্যপ্রণালী ---
+            # মেশানো টার্নে প্রতিটি মেসেজই FAQ হলে তবেই FAQ উত্তর, নইলে পুরোটা AI-কে
+            texts = (messaging_event.get('coalesced') or {}).get('texts') or [message_text]
+            if len(texts) > 1:
+                metrics.annotate(coalesced=len(texts))
+            with metrics.timed('faq_match'):
+                faq_replies = [faq_matcher.match(text) for text in texts]
+            if all(faq_replies):
+                for faq_response in dict.fromkeys(faq_replies):
+                    send_facebook_message(sender_id, faq_response)
+                return 'faq'
 
-    customer_details = get_saved_customer_details(sender_id)
+            # যদি FAQ না হয়, তবেই AI ব্যবহার করা
+            with metrics.timed('history_write'):
+                save_message_to_db(sender_id, 'user', message_text)
+            if model:
+                try:
+                    reply_writer = None
+                    if streaming.GEMINI_STREAMING:
+                        # স্ট্রিমিং মোড: সাথে সাথে typing দেখানো, সম্পূর্ণ বাক্য এলেই পাঠানো
+                        send_sender_action(sender_id, 'typing_on')
+                        reply_writer = streaming.StreamingReplyWriter(lambda text: send_facebook_message(sender_id, text))
+                        bot_response = get_gemini_response(sender_id, message_text, on_text=reply_writer.feed)
+                        reply_writer.finish()
+                    else:
+                        bot_response = get_gemini_response(sender_id, message_text)
+                    with metrics.timed('history_write'):
+                        save_message_to_db(sender_id, 'model', bot_response)
+                    
+                    user_facing_response = bot_response
+                    
+                    if "[ORDER_CONFIRMATION]" in bot_response:
+                        # অর্ডার আর তার সব পার্শ্ব-কাজ (outbox) একটি Mongo write-এ; গ্রাহকের উত্তর, মালিককে অ্যালার্ট,
+                        # লেবেল আর OTN order_pipeline-এর worker একসাথে পাঠাবে, ব্যর্থ হলে আবার চেষ্টা করবে
+                        with metrics.timed('tag_parse'):
+                            parsed_order = order_pipeline.parse_order(bot_response)
+                        with metrics.timed('order_write'):
+                            order_id = order_pipeline.create_order(sender_id, bot_response, messaging_event['message'].get('mid'),
+                                                                   parsed_order)
+                        metrics.annotate(order_id=order_id)
+                        return 'order'
+                    elif reply_writer is None or reply_writer.text != bot_response:
+                        # ক্যাশ থেকে আসা বা ত্রুটির উত্তর স্ট্রিম হয়নি, তাই পুরোটা একবারে পাঠানো
+                        send_facebook_message(sender_id, user_facing_response)
+                    return 'llm'
+
+                except Exception as e:
+                    print(f"Gemini থেকে উত্তর আনতে সমস্যা হয়েছে: {e}")
+                    send_facebook_message(sender_id, "দুঃখিত, এই মুহূর্তে উত্তর দিতে পারছি না।")
+                    return 'error'
+
+def get_gemini_response(sender_id, message, on_text=None):
+    with metrics.timed('history_fetch'):
+        history = get_chat_history(sender_id, limit=6)
+
+    with metrics.timed('details_fetch'):
+        customer_details = get_saved_customer_details(sender_id)
     details_context = "এই গ্রাহকের কোনো তথ্য আমাদের কাছে সেভ করা নেই।"
     saved_address = ""
     if customer_details and customer_details.get('address'):
         saved_address = customer_details.get('address')
         details_context = f"এই গ্রাহকের একটি ঠিকানা আমাদের কাছে সেভ করা আছে: {saved_address}"
     
-    knowledge_base_for_prompt = get_full_knowledge_base()
-
-    prompt = f"""
-    ### আপনার ব্যক্তিত্ব (Persona) ###
-    আপনি "ঘরের খাবার" এর একজন দক্ষ এবং পেশাদার সহকারী। আপনার উত্তর হবে সংক্ষিপ্ত, নির্ভুল এবং সাহায্যকারী।
+    # একই ধরনের সাধারণ প্রশ্নের জন্য আগের Gemini উত্তর ব্যবহার করা;
+    # সেভ করা ঠিকানা থাকলে উত্তর সেই ঠিকানার উপর নির্ভর করতে পারে, তাই তখন ক্যাশ নয়
+    cache_key = None
+    if not saved_address and response_cache.is_cacheable(message, history):
+        with metrics.timed('response_cache'):
+            cache_key = response_cache.make_key(message, get_knowledge_fingerprint())
+            cached_response = response_cache.get(cache_key)
+        if cached_response is not None:
+            metrics.annotate(response_cache='hit')
+            return cached_response
 
-    ### আপনার জ্ঞান (Knowledge Base) ###
-    {knowledge_base_for_prompt}
-    
-    ### গ্রাহকের সেভ করা তথ্য ###
-    {details_context}
-
-    ### কঠোর নির্দেশনা (Strict Instructions) ###
-    1.  **সীমানা:** সর্বদা এবং শুধুমাত্র "আপনার জ্ঞান" এবং "পূর্বের কথোপকথন" এর উপর ভিত্তি করে উত্তর দিন। এর বাইরে একটি শব্দও বলা যাবে না।
-    2.  **অজানা প্রশ্ন:** যদি গ্রাহকের প্রশ্নের উত্তর "আপনার জ্ঞান"-এর মধ্যে না থাকে, তাহলে বলুন: "দুঃখিত, এই বিষয়ে আমি নিশ্চিত নই। আপনাকে সাহায্য করার জন্য আমাদের একজন প্রতিনিধি শীঘ্রই আপনার সাথে যোগাযোগ করবে।"
-    3.  **ক্রমিক নম্বর বোঝা:** "আপনার জ্ঞান"-এর মধ্যে দেওয়া মেন্যুটি একটি numerised তালিকা। যদি গ্রাহক "১ নম্বর" বা "১ ও ২ নম্বর" বলে, তাহলে আপনাকে অবশ্যই তালিকা থেকে সঠিক আইটেমগুলো শনাক্ত করতে হবে।
-    4.  **প্রসঙ্গ বোঝা (সবচেয়ে গুরুত্বপূর্ণ):** যদি আপনার আগের প্রশ্নে আপনি কোনো কনফার্মেশন চেয়ে থাকেন (যেমন: "আপনি কি অর্ডার করতে চান?") এবং গ্রাহক "জ্বি", "হ্যাঁ", "hmm", "ok", "কনফার্ম", "নিতে চাই", "চাই" এই ধরনের কোনো ইতিবাচক উত্তর দেয়, তাহলে প্রশ্নটি পুনরাবৃত্তি না করে অর্ডারের পরবর্তী ধাপে চলে যাবেন (যেমন: বিল হিসাব করা বা ঠিকানা চাওয়া)।
-    5.  **হিসাব করা:** যদি গ্রাহক একাধিক আইটেমের মোট দাম জানতে চায়, তাহলে "পূর্বের কথোপকথন" এবং "আপনার জ্ঞান" থেকে আইটেম ও দাম নিয়ে সঠিকভাবে হিসাব করে একটি ব্রেকডাউন সহ মোট বিল দেখাবেন।
-    6.  **অর্ডার কনফার্ম করা:** গ্রাহক যখন তার নাম, ঠিকানা এবং ফোন নম্বর দেবে, তখনই অর্ডারটি চূড়ান্তভাবে নিশ্চিত হবে। তখন আপনার উত্তরের শুরুতে অবশ্যই "[ORDER_CONFIRMATION]" ট্যাগটি যোগ করবেন। এরপর "[BILL:মোট_টাকা]" এবং "[DETAILS:নাম=..., ঠিকানা=..., ফোন=...]" ট্যাগগুলো যোগ করবেন।
-    
-    ### কথোপকথনের উদাহরণ ###
-    user: আমার ১ ও ২ নম্বর আইটেম লাগবে।
-    model: আপনি কি মেন্যুর ১ নম্বর (চিকেন রোল) এবং ২ নম্বর (ভেজিটেবল রোল) আইটেমগুলো অর্ডার করতে চান?
-    user: জ্বি
-    model: অবশ্যই! আপনার দুটি আইটেমের মোট দাম আসছে:\n- চিকেন রোল (১ প্যাকেট): ২২৫ টাকা\n- ভেজিটেবল রোল (১ প্যাকেট): ১৫০ টাকা\n- ডেলিভারি চার্জ: ৬০ টাকা\n\nসর্বমোট: ২২৫ + ১৫০ + ৬০ = ৪৩৫ টাকা। আপনার অর্ডারটি কনফার্ম করার জন্য আপনার নাম, ঠিকানা ও ফোন নম্বর দিন।
-    user: নাম: Rahim, ঠিকানা: Dhaka, ফোন: 123
-    model: [ORDER_CONFIRMATION]\n[BILL:435]\n[DETAILS:নাম=Rahim, ঠিকানা=Dhaka, ফোন=123]
-
-    ### পূর্বের কথোপকথন ###
-    {formatted_history}
-
-    ### নতুন মেসেজ ###
-    user: "{message}"
-    model: 
-    """
+    with metrics.timed('kb_build'):
+        knowledge_entries = get_knowledge_entries(message, history)
+    with metrics.timed('prompt_build'):
+        prompt, prompt_sections = prompt_builder.build_prompt(
+            message, history, details_context, knowledge_entries, FULL_MENU,
+            knowledge_budgeted=knowledge_index.KNOWLEDGE_MODE != 'full')
+    prompt_builder.log_sections(sender_id, prompt_sections)
+    metrics.annotate(prompt_tokens=prompt_sections)
     
     try:
-        response = model.generate_content(prompt)
-        return response.text
+        started = time.perf_counter()
+        with metrics.timed('llm_call'):
+            if on_text:
+                # প্রতিটি অংশ আসার সাথে সাথে on_text-এ পাঠানো
+                parts = []
+                for chunk in model.generate_content(prompt, stream=True):
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # শেষ chunk-এ শুধু finish_reason থাকলে text নেই
+                        continue
+                    parts.append(text)
+                    on_text(text)
+                response_text = "".join(parts)
+            else:
+                response_text = model.generate_content(prompt).text
+        if cache_key:
+            response_cache.put(cache_key, response_text, time.perf_counter() - started)
+        return response_text
     except Exception as e:
         print(f"Gemini API Error: {e}")
         return "দুঃখিত, একটি প্রযুক্তিগত সমস্যা হয়েছে।"
@@ -207,41 +316,57 @@ def get_chat_history_count(sender_id):
 
 def save_message_to_db(sender_id, role, content):
     if client:
-        chat_history_collection.insert_one({'sender_id': sender_id,'role': role,'content': content,'timestamp': datetime.utcnow()})
+        doc = {'sender_id': sender_id,'role': role,'content': content,'timestamp': datetime.utcnow()}
+        if session_cache.SESSION_CACHE_ENABLED:
+            # মেমরিতে সাথে সাথে, Mongo-তে পরে ব্যাচে (insert_many) লেখা হবে
+            session_cache.record_turn(sender_id, doc)
+        else:
+            chat_history_collection.insert_one(doc)
+
+def load_chat_history(sender_id, limit=6):
+    # Mongo থেকে শেষ limit টি মেসেজ, পুরনো থেকে নতুন ক্রমে
+    history_cursor = chat_history_collection.find({'sender_id': sender_id}).sort('timestamp', -1).limit(limit)
+    history = []
+    for doc in history_cursor:
+        role = doc.get('role')
+        if role == 'assistant':
+            role = 'model'
+        history.append({'_id': doc.get('_id'), 'role': role, 'content': doc.get('content')})
+    history.reverse()
+    return history
 
 def get_chat_history(sender_id, limit=6):
     if client:
-        history_cursor = chat_history_collection.find({'sender_id': sender_id}).sort('timestamp', -1).limit(limit)
-        history = []
-        for doc in history_cursor:
-            role = doc.get('role')
-            if role == 'assistant':
-                role = 'model'
-            history.append({'role': role, 'content': doc.get('content')})
-        return history
+        if session_cache.SESSION_CACHE_ENABLED:
+            return session_cache.get_history(sender_id, limit, load_chat_history)
+        return load_chat_history(sender_id, limit)
     return []
     
-def save_customer_details(sender_id, details_str):
+def save_customer_details(sender_id, customer):
+    # customer: order_pipeline.parse_details-এর ফল, {'name', 'address', 'phone'}
     try:
-        details = dict(item.split("=") for item in details_str.strip().split(", "))
         if client:
-            update_data = {
-                'name': details.get('নাম'),
-                'address': details.get('ঠিকানা'),
-                'phone': details.get('ফোন'),
-                'last_updated': datetime.utcnow(),
-            }
+            update_data = {key: customer.get(key) for key in ('name', 'address', 'phone')}
             update_data = {k: v for k, v in update_data.items() if v is not None}
+            update_data['last_updated'] = datetime.utcnow()
             customer_details_collection.update_one(
                 {'sender_id': sender_id},
                 {'$set': update_data},
                 upsert=True)
+            session_cache.update_details(sender_id, update_data)
+        return True
     except Exception as e:
-        print(f"গ্রাহকের তথ্য পার্স করতে সমস্যা: {e}")
+        print(f"গ্রাহকের তথ্য সেভ করতে সমস্যা: {e}")
+        return False
+
+def load_customer_details(sender_id):
+    return customer_details_collection.find_one({'sender_id': sender_id})
 
 def get_saved_customer_details(sender_id):
     if client:
-        return customer_details_collection.find_one({'sender_id': sender_id})
+        if session_cache.SESSION_CACHE_ENABLED:
+            return session_cache.get_details(sender_id, load_customer_details)
+        return load_customer_details(sender_id)
     return None
 
 def send_otn_request(recipient_id):
@@ -249,9 +374,13 @@ def send_otn_request(recipient_id):
     headers = {'Content-Type': 'application/json'}
     data = {'recipient': {'id': recipient_id},'message': {"attachment": {"type": "template","payload": {"template_type": "one_time_notif_req","title": "আমাদের পরবর্তী অফার সম্পর্কে জানতে চান?","payload": "notify_me_payload" }}}}
     try:
-        requests.post(GRAPH_API_URL, params=params, headers=headers, json=data)
-    except Exception:
-        pass
+        with metrics.timed('send_otn'):
+            response = http_client.post(GRAPH_API_URL, endpoint='graph.otn_request', params=params, headers=headers, json=data)
+        response.raise_for_status()
+        return True
+    except Exception as e:
+        print(f"OTN রিকোয়েস্ট পাঠাতে সমস্যা ({recipient_id}): {e}")
+        return False
 
 def send_telegram_notification(order_details):
     if not TELEGRAM_USERNAME or not CALLMEBOT_API_KEY:
@@ -260,48 +389,146 @@ def send_telegram_notification(order_details):
     encoded_message = urllib.parse.quote_plus(message_body)
     api_url = f"https://api.callmebot.com/text.php?user={TELEGRAM_USERNAME}&text={encoded_message}&apikey={CALLMEBOT_API_KEY}"
     try:
-        requests.get(api_url, timeout=10)
-    except Exception:
-        pass
+        with metrics.timed('send_alert'):
+            # GET হলেও প্রতিবার একটি মেসেজ পাঠায়, তাই নিশ্চিত প্রত্যাখ্যান ছাড়া রিট্রাই নয় (মালিক দুবার অ্যালার্ট পাবেন না)
+            response = http_client.get(api_url, endpoint='callmebot.text', idempotent=False)
+        response.raise_for_status()
+        return True
+    except Exception as e:
+        print(f"অর্ডার অ্যালার্ট পাঠাতে সমস্যা: {e}")
+        return False
 
 def get_or_create_label_id(label_name):
-    get_labels_url = f"https://graph.facebook.com/v19.0/me/custom_labels"
+    get_labels_url = f"{GRAPH_API_BASE}/me/custom_labels"
     params = {'fields': 'name', 'access_token': FACEBOOK_PAGE_ACCESS_TOKEN}
     try:
-        response = requests.get(get_labels_url, params=params, timeout=10)
+        response = http_client.get(get_labels_url, endpoint='graph.custom_labels', params=params)
         response.raise_for_status()
         existing_labels = response.json().get('data', [])
         for label in existing_labels:
             if label.get('name') == label_name:
                 return label.get('id')
-        create_label_url = f"https://graph.facebook.com/v19.0/me/custom_labels"
+        create_label_url = f"{GRAPH_API_BASE}/me/custom_labels"
         data = {'name': label_name}
-        response = requests.post(create_label_url, params={'access_token': FACEBOOK_PAGE_ACCESS_TOKEN}, json=data, timeout=10)
+        response = http_client.post(create_label_url, endpoint='graph.custom_labels', params={'access_token': FACEBOOK_PAGE_ACCESS_TOKEN}, json=data)
         response.raise_for_status()
         new_label = response.json()
         return new_label.get('id')
-    except requests.exceptions.RequestException:
+    except requests.exceptions.RequestException as e:
+        print(f"লেবেল {label_name} খুঁজতে/তৈরি করতে সমস্যা: {e}")
         return None
 
-def apply_date_label(user_psid):
-    today_label_name = datetime.now().strftime("%d-%m-%Y")
+def apply_date_label(user_psid, label_date=None):
+    # label_date: অর্ডারের তারিখ, যাতে রিট্রাই/রিপ্লে পরের দিনে হলেও সঠিক লেবেল বসে
+    today_label_name = (label_date or datetime.now()).strftime("%d-%m-%Y")
     label_id = get_or_create_label_id(today_label_name)
     if not label_id:
-        return
-    apply_label_url = f"https://graph.facebook.com/v19.0/{label_id}/label"
+        return False
+    apply_label_url = f"{GRAPH_API_BASE}/{label_id}/label"
     params = {'user': user_psid, 'access_token': FACEBOOK_PAGE_ACCESS_TOKEN}
     try:
-        response = requests.post(apply_label_url, params=params, timeout=10)
+        with metrics.timed('apply_label'):
+            response = http_client.post(apply_label_url, endpoint='graph.apply_label', params=params)
         response.raise_for_status()
-    except Exception:
-        pass
+        return True
+    except Exception as e:
+        print(f"লেবেল লাগাতে সমস্যা ({user_psid}): {e}")
+        return False
+
+def send_sender_action(recipient_id, action):
+    params = {'access_token': FACEBOOK_PAGE_ACCESS_TOKEN}
+    data = {'recipient': {'id': recipient_id}, 'sender_action': action}
+    try:
+        with metrics.timed('send_typing'):
+            http_client.post(GRAPH_API_URL, endpoint='graph.sender_action', params=params, json=data, retries=0, max_wait=0)
+    except Exception as e:
+        # typing নির্দেশক না গেলেও উত্তর পাঠানো চলবে
+        print(f"sender action পাঠাতে সমস্যা ({recipient_id}): {e}")
 
 def send_facebook_message(recipient_id, message_text):
     params = {'access_token': FACEBOOK_PAGE_ACCESS_TOKEN}
     headers = {'Content-Type': 'application/json'}
     data = {'recipient': {'id': recipient_id},'message': {'text': message_text},'messaging_type': 'RESPONSE'}
     try:
-        requests.post(GRAPH_API_URL, params=params, headers=headers, json=data, timeout=10)
-    except Exception:
-        pass
+        with metrics.timed('send_message'):
+            response = http_client.post(GRAPH_API_URL, endpoint='graph.messages', params=params, headers=headers, json=data,
+                                        max_wait=GRAPH_REPLY_MAX_WAIT)
+        response.raise_for_status()
+        return True
+    except Exception as e:
+        print(f"মেসেজ পাঠাতে সমস্যা ({recipient_id}): {e}")
+        return False
+
+# --- অর্ডার কনফার্মেশনের পার্শ্ব-কাজ (order_pipeline worker চালায়, False মানে ব্যর্থ, পরে আবার চেষ্টা) ---
+def send_order_confirmation(order):
+    total_bill = order.get('bill_text') or "মোট বিল"
+    confirmation_message = f"ধন্যবাদ, আপনার মোট চার্জ {total_bill} টাকা।\nআপনি ১ থেকে ৩ দিনের মধ্যে প্রোডাক্টস পেয়ে যাবেন।\nদয়া করে কনফার্ম করার পর ক্যানসেল করিয়েন না, কারণ আমরা অর্ডার দেয়ার পর তৈরি করি।"
+    return send_facebook_message(order['sender_id'], confirmation_message)
+
+def save_order_details(order):
+    if not order.get('details_raw'):
+        return True
+    # DETAILS ট্যাগ অর্ডার তৈরির সময়েই একবার পার্স হয়েছে; তাতে কিছু না পেলে রিট্রাই করে লাভ নেই
+    if not order.get('customer'):
+        raise order_pipeline.PermanentError(f"DETAILS ট্যাগে নাম/ঠিকানা/ফোন পাওয়া যায়নি: {order['details_raw']}")
+    return save_customer_details(order['sender_id'], order['customer'])
+
+def send_order_alert(order):
+    # CallMeBot কনফিগার করা না থাকলে None, অর্থাৎ করার কিছু নেই
+    return send_telegram_notification(f"{order['raw_response']}\nঅর্ডার আইডি: {order['_id']}")
+
+def label_order(order):
+    return apply_date_label(order['sender_id'], order['created_at'])
+
+def request_order_otn(order):
+    return send_otn_request(order['sender_id'])
+
+ORDER_EFFECTS = [
+    ('customer_reply', send_order_confirmation, ()),
+    ('save_details', save_order_details, ()),
+    ('owner_alert', send_order_alert, ()),
+    ('date_label', label_order, ()),
+    # OTN অনুরোধ কনফার্মেশন মেসেজের পরেই যাবে
+    ('otn_request', request_order_otn, ('customer_reply',)),
+]
+# ----------------------------------------------------
 
+# --- ডেটাবেস ইনডেক্স তৈরি (আগে থেকে থাকলে কিছুই হয় না), অ্যাপ চালু আটকে না রেখে ---
+if client and AUTO_CREATE_INDEXES:
+    threading.Thread(target=db_indexes.ensure_indexes, args=(db,), name='ensure-indexes', daemon=True).start()
+# ----------------------------------------------------
+
+# --- FAQ ম্যাচার একবার কম্পাইল করা (Mongo 'faq' কালেকশন ব্যাকগ্রাউন্ডে লোড হয়) ---
+faq_matcher.init(faq_matcher.entries_from_mapping(FAQ_RESPONSES), faq_collection if client else None)
+# ----------------------------------------------------
+
+# --- Gemini উত্তর ক্যাশ (শেয়ার্ড Mongo স্তর ঐচ্ছিক) ---
+response_cache.init(response_cache_collection if client else None)
+# ----------------------------------------------------
+
+# --- প্রতি গ্রাহকের কথোপকথন ক্যাশ ও write-behind ফ্লাশার ---
+if client and session_cache.SESSION_CACHE_ENABLED:
+    session_cache.init(chat_history_collection)
+# ----------------------------------------------------
+
+# --- জ্ঞানভান্ডার ক্যাশ চালু করা ---
+if client:
+    knowledge_cache.init(knowledge_collection)
+# ----------------------------------------------------
+
+# --- অর্ডার outbox worker চালু করা (আগের রানের বাকি অর্ডারও তুলে নেবে) ---
+order_pipeline.init(orders_collection if client else None, ORDER_EFFECTS)
+order_pipeline.start()
+# ----------------------------------------------------
+
+# --- ওয়েবহুক ডুপ্লিকেট চেক (শেয়ার্ড Mongo স্তরসহ) ---
+message_dedup.init(webhook_dedup_collection if client else None)
+# ----------------------------------------------------
+
+# --- ব্যাকগ্রাউন্ড webhook worker চালু করা ---
+# মেসেজ মেশানো চালু থাকলে মেশানো টার্ন ওয়েবহুক ফেরত দেওয়ার পরে প্রসেস হয়, তাই কিউ লাগে
+if ASYNC_WEBHOOK or message_coalescer.enabled():
+    work_queue.start_workers(process_messaging_event, webhook_queue_collection if client else None)
+if message_coalescer.enabled():
+    message_coalescer.start(work_queue.enqueue_event)
+# ----------------------------------------------------
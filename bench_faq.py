@@ -0,0 +1,53 @@
+import re
+import sys
+import timeit
+
+import faq_matcher
+
+# প্রতি মেসেজে পুরনো keyword-লুপ আর কম্পাইল করা FAQ ম্যাচারের খরচের তুলনা
+# ব্যবহার: python bench_faq.py [প্রতি মেসেজে পুনরাবৃত্তি]
+
+FAQ_RESPONSES = {
+    ("hi", "hello", "هاي", "هلو", "আসসালামু আলাইকুম"): "greeting",
+    ("thanks", "thank you", "شكرا", "ধন্যবাদ"): "thanks",
+}
+
+SAMPLE_MESSAGES = [
+    "hi",
+    "Hello, is anyone there?",
+    "আসসালামু আলাইকুম",
+    "আসসালামু আলাইকুম, চিকেন রোলের দাম কত?",
+    "ধন্যবাদ ভাই",
+    "চিকেন রোল ২ প্যাক লাগবে",
+    "ডেলিভারি চার্জ কত?",
+    "নাম: Rahim, ঠিকানা: Mirpur 10, Dhaka, ফোন: 01700000000",
+    "this is a fairly long message that mentions nothing from the faq list at all " * 3,
+    "شكرا",
+]
+
+
+def legacy_match(message_text):
+    lower_message = message_text.lower()
+    for keywords, response in FAQ_RESPONSES.items():
+        for keyword in keywords:
+            if re.search(r'\b' + re.escape(keyword) + r'\b', lower_message):
+                return response
+    return None
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    faq_matcher.init(faq_matcher.entries_from_mapping(FAQ_RESPONSES))
+
+    print(f"{'message':<45} {'legacy':>10} {'compiled':>10} {'legacy_us':>10} {'compiled_us':>12}")
+    legacy_total = compiled_total = 0.0
+    for message in SAMPLE_MESSAGES:
+        legacy_time = timeit.timeit(lambda: legacy_match(message), number=number) / number * 1e6
+        compiled_time = timeit.timeit(lambda: faq_matcher.match(message), number=number) / number * 1e6
+        legacy_total += legacy_time
+        compiled_total += compiled_time
+        label = message[:42] + '...' if len(message) > 45 else message
+        print(f"{label:<45} {str(legacy_match(message)):>10} {str(faq_matcher.match(message)):>10} "
+              f"{legacy_time:>10.2f} {compiled_time:>12.2f}")
+    count = len(SAMPLE_MESSAGES)
+    print(f"\nপ্রতি মেসেজে গড়: legacy {legacy_total / count:.2f}us, compiled {compiled_total / count:.2f}us")
@@ -0,0 +1,466 @@
+import argparse
+import json
+import math
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import requests
+
+from bench_streaming import NORMAL_REPLY, ORDER_REPLY, FakeChunk, FakeResponse
+from stub_graph_server import start_stub_server
+
+# Procfile-এর gunicorn কনফিগারেশনে app:app প্রতি সেকেন্ডে কত মেসেজ সামলাতে পারে তার লোড টেস্ট।
+# নকল Graph API সার্ভার, ল্যাটেন্সি-বণ্টনসহ নকল Gemini মডেল আর mongomock (অথবা লোকাল mongod) ব্যবহার করে।
+# ব্যবহার:
+#   python bench_load.py                                         # ডিফল্ট কনফিগারেশনগুলো তুলনা
+#   python bench_load.py --configs 1x2,1x8,1x8:async --users 40 --duration 30
+#   python bench_load.py --llm-latency lognormal:0.8:0.4 --env GEMINI_STREAMING=1
+#   python bench_load.py --configs 1x8:async --redeliver 0.1 --env MESSAGE_COALESCE_WINDOW=1
+#   python bench_load.py --baseline bench_load_results.json --output new_results.json
+#   python bench_load.py --mongo-uri mongodb://127.0.0.1:27017   # ফেলে দেওয়ার মতো লোকাল mongod
+# কনফিগারেশন: <workers>x<threads>[:async], যেমন 2x4:async মানে ২ worker, ৪ thread, ASYNC_WEBHOOK=1।
+# --mongo-uri ছাড়া mongomock লাগে: pip install -r requirements-dev.txt
+# mongomock-এ প্রতিটি worker প্রসেসের আলাদা ডেটাবেস থাকে, তাই একাধিক worker-এ লোকাল mongod বেশি বাস্তবসম্মত।
+
+DEFAULT_CONFIGS = '1x2,1x8,1x2:async,2x4:async'
+
+# (নাম, ওজন, মেসেজগুলো) - বাস্তব কথোপকথনের মতো মিশ্রণ
+SCENARIOS = [
+    ('greeting', 3, [["আসসালামু আলাইকুম"], ["hi"], ["ধন্যবাদ"]]),
+    ('menu_question', 5, [["চিকেন রোলের দাম কত?"], ["ডেলিভারি চার্জ কত?"], ["আজকে কি কি খাবার আছে?"],
+                          ["বিফ রোল কি পাওয়া যাবে?"]]),
+    ('order_flow', 2, [["আমার ১ ও ২ নম্বর আইটেম লাগবে।", "জ্বি", "নাম: Rahim, ঠিকানা: Dhaka, ফোন: 01700000000"]]),
+    # উত্তরের অপেক্ষা না করে পরপর কয়েকটি ছোট মেসেজ
+    ('burst', 2, [["hi", "chicken roll", "2 ta", "price?"], ["ডেলিভারি", "মিরপুর", "কত টাকা?"]]),
+]
+# পরপর মেসেজের মাঝে বিরতি (সেকেন্ড)
+BURST_GAP = 0.3
+
+SAMPLE_KNOWLEDGE = [
+    "ডেলিভারি চার্জ ঢাকার ভেতরে ৬০ টাকা, ঢাকার বাইরে ১২০ টাকা।",
+    "অর্ডার কনফার্ম করার ১ থেকে ৩ দিনের মধ্যে ডেলিভারি দেওয়া হয়।",
+    "সব রোল ফ্রোজেন অবস্থায় পাঠানো হয়, ফ্রিজে ১৫ দিন রাখা যায়।",
+    "বিকাশ ও ক্যাশ অন ডেলিভারি দুটোই গ্রহণ করা হয়।",
+    "সকাল ১০টা থেকে রাত ১০টা পর্যন্ত অর্ডার নেওয়া হয়।",
+]
+
+CONFIRM_REPLY = "আপনি কি মেন্যুর ১ নম্বর (চিকেন রোল) এবং ২ নম্বর (ভেজিটেবল রোল) আইটেমগুলো অর্ডার করতে চান?"
+MENU_REPLY = "চিকেন রোল ১৫ পিসের প্যাক ২২৫ টাকা, ভেজিটেবল রোল ১৫০ টাকা আর বিফ রোল ১০ পিসের প্যাক ২৫০ টাকা। ডেলিভারি চার্জ ঢাকার ভেতরে ৬০ টাকা।"
+
+
+# --- নকল Gemini মডেল ---
+def parse_distribution(spec):
+    # fixed:SECONDS, uniform:LOW:HIGH, lognormal:MEDIAN:SIGMA
+    kind, *params = spec.split(':')
+    values = [float(value) for value in params]
+    if kind == 'fixed' and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == 'uniform' and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == 'lognormal' and len(values) == 2:
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"অজানা ল্যাটেন্সি বণ্টন: {spec}")
+
+
+class FakeGeminiModel:
+    # প্রম্পটের নতুন মেসেজ দেখে বাস্তবের মতো উত্তর দেয়; প্রথম টোকেনের সময় বণ্টন থেকে নেওয়া
+    def __init__(self, first_token_latency, chunk_delay=0.02, chunk_size=24):
+        self.first_token_latency = first_token_latency
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+        self.rng = random.Random()
+
+    def _reply_for(self, prompt):
+        message = prompt[prompt.rfind('user: "'):]
+        if 'ফোন' in message:
+            return ORDER_REPLY
+        if 'নম্বর' in message:
+            return CONFIRM_REPLY
+        if 'জ্বি' in message:
+            return NORMAL_REPLY
+        return MENU_REPLY
+
+    def generate_content(self, prompt, stream=False):
+        reply = self._reply_for(prompt)
+        chunks = [reply[i:i + self.chunk_size] for i in range(0, len(reply), self.chunk_size)]
+        first_delay = self.first_token_latency(self.rng)
+        if not stream:
+            time.sleep(first_delay + self.chunk_delay * (len(chunks) - 1))
+            return FakeResponse(reply)
+        return self._stream(chunks, first_delay)
+
+    def _stream(self, chunks, first_delay):
+        time.sleep(first_delay)
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(self.chunk_delay)
+            yield FakeChunk(chunk)
+
+
+# --- সার্ভার প্রসেস (gunicorn worker-এর ভেতরে) ---
+def load_bench_app(llm_latency, llm_chunk_delay, use_mongomock):
+    if use_mongomock:
+        import mongomock
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+    import app as chatbot
+    import knowledge_cache
+
+    chatbot.model = FakeGeminiModel(parse_distribution(llm_latency), llm_chunk_delay)
+    if use_mongomock and chatbot.client:
+        chatbot.knowledge_collection.insert_many([{'information': info} for info in SAMPLE_KNOWLEDGE])
+        knowledge_cache.invalidate()
+    return chatbot.app
+
+
+def serve(args):
+    from gunicorn.app.base import BaseApplication
+
+    class BenchApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f"127.0.0.1:{args.port}")
+            self.cfg.set('workers', args.workers)
+            self.cfg.set('threads', args.threads)
+            self.cfg.set('timeout', 120)
+            self.cfg.set('loglevel', 'warning')
+
+        def load(self):
+            # preload ছাড়া প্রতিটি worker নিজে অ্যাপ লোড করে, তাই ব্যাকগ্রাউন্ড থ্রেডগুলো fork-এর পরে চালু হয়
+            return load_bench_app(args.llm_latency, args.llm_chunk_delay, not args.mongo_uri)
+
+    BenchApplication().run()
+
+
+# --- লোড জেনারেটর ---
+def parse_config(spec):
+    shape, _, mode = spec.partition(':')
+    workers, threads = (int(value) for value in shape.split('x'))
+    if mode not in ('', 'async'):
+        raise ValueError(f"অজানা মোড: {spec}")
+    return {'name': spec, 'workers': workers, 'threads': threads, 'async': mode == 'async'}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def latency_summary(seconds):
+    return {f"p{pct}": round(percentile(seconds, pct) * 1000, 1) for pct in (50, 95, 99)} | {
+        'max': round(max(seconds) * 1000, 1) if seconds else 0.0}
+
+
+class ReplyTracker:
+    # নকল Graph সার্ভারে কোনো গ্রাহকের কাছে টেক্সট মেসেজ পৌঁছালে অপেক্ষমাণ ভার্চুয়াল ইউজারকে জাগানো
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiting = {}
+
+    def expect(self, sender_id):
+        event = threading.Event()
+        event.arrived_at = None
+        with self.lock:
+            self.waiting[sender_id] = event
+        return event
+
+    def cancel(self, sender_id):
+        with self.lock:
+            self.waiting.pop(sender_id, None)
+
+    def on_request(self, record):
+        body = record['body']
+        if not body.get('message', {}).get('text'):
+            return
+        with self.lock:
+            event = self.waiting.pop(body.get('recipient', {}).get('id'), None)
+        if event is not None:
+            event.arrived_at = time.perf_counter()
+            event.set()
+
+
+def webhook_payload(sender_id, text):
+    now_ms = int(time.time() * 1000)
+    return {'object': 'page', 'entry': [{'id': 'bench-page', 'time': now_ms, 'messaging': [{
+        'sender': {'id': sender_id}, 'recipient': {'id': 'bench-page'}, 'timestamp': now_ms,
+        'message': {'mid': f"m_{uuid.uuid4().hex}", 'text': text},
+    }]}]}
+
+
+def virtual_user(user_index, base_url, tracker, deadline, reply_timeout, samples, seed, redeliver=0.0):
+    rng = random.Random(seed + user_index)
+    weights = [weight for _, weight, _ in SCENARIOS]
+    session = requests.Session()
+    conversation = 0
+    while time.perf_counter() < deadline:
+        scenario, _, variants = rng.choices(SCENARIOS, weights)[0]
+        messages = rng.choice(variants)
+        sender_id = f"bench-{user_index}-{conversation}"
+        conversation += 1
+        for index, text in enumerate(messages):
+            if time.perf_counter() >= deadline:
+                return
+            if scenario == 'burst' and index < len(messages) - 1:
+                # বার্স্টের মাঝের মেসেজ: শুধু পাঠানো, উত্তর মাপা হয় শেষ মেসেজ থেকে
+                session.post(f"{base_url}/webhook", json=webhook_payload(sender_id, text), timeout=reply_timeout)
+                time.sleep(BURST_GAP)
+                continue
+            event = tracker.expect(sender_id)
+            payload = webhook_payload(sender_id, text)
+            started = time.perf_counter()
+            try:
+                response = session.post(f"{base_url}/webhook", json=payload, timeout=reply_timeout)
+                status = response.status_code
+                if rng.random() < redeliver:
+                    # Facebook-এর টাইমআউট রিট্রাইয়ের মতো একই mid আবার পাঠানো
+                    session.post(f"{base_url}/webhook", json=payload, timeout=reply_timeout)
+            except requests.exceptions.RequestException:
+                status = None
+            acked = time.perf_counter()
+            replied = status == 200 and event.wait(max(0.0, reply_timeout - (acked - started)))
+            if not replied:
+                tracker.cancel(sender_id)
+            samples.append({'scenario': scenario, 'started': started, 'ack': acked - started, 'status': status,
+                            'latency': event.arrived_at - started if replied else None})
+            if not replied:
+                break
+
+
+def read_traces(path):
+    traces = []
+    with open(path, encoding='utf-8', errors='replace') as log_file:
+        for line in log_file:
+            if not line.startswith('{"trace"'):
+                continue
+            try:
+                traces.append(json.loads(line))
+            except ValueError:
+                # একাধিক থ্রেডের print মাঝে মাঝে একসাথে মিশে যেতে পারে
+                continue
+    return traces
+
+
+def stage_breakdown(traces):
+    stages = {}
+    outcomes = {}
+    for trace in traces:
+        outcomes.setdefault(trace['outcome'], []).append(trace['total_ms'] / 1000)
+        for stage, elapsed_ms in trace['stages']:
+            stages.setdefault(stage, []).append(elapsed_ms)
+    return (
+        {stage: {'count': len(values), 'avg_ms': round(sum(values) / len(values), 2),
+                 'p95_ms': round(percentile(values, 95), 2)} for stage, values in sorted(stages.items())},
+        {outcome: {'count': len(values)} | latency_summary(values) for outcome, values in sorted(outcomes.items())},
+    )
+
+
+def wait_until_ready(base_url, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            if requests.get(f"{base_url}/", timeout=1).status_code == 200:
+                return True
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def run_config(config, args, graph_base_url, tracker):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ)
+    # .env-এর আসল টোকেন/কী যেন কখনো ব্যবহার না হয় (load_dotenv আগে থেকে সেট করা মান বদলায় না)
+    env.update({
+        'PYTHONUNBUFFERED': '1',
+        'ASYNC_WEBHOOK': '1' if config['async'] else '0',
+        'GRAPH_API_BASE': f"{graph_base_url}/v19.0",
+        'FACEBOOK_PAGE_ACCESS_TOKEN': 'bench-token',
+        'GEMINI_API_KEY': 'bench-key',
+        'TELEGRAM_USERNAME': '',
+        'CALLMEBOT_API_KEY': '',
+        'MONGO_URI': args.mongo_uri or 'mongodb://127.0.0.1:27017',
+        'AUTO_CREATE_INDEXES': '1' if args.mongo_uri else '0',
+        'TRACE_LOGS': '1',
+        'PROMPT_LOG_SECTIONS': '0',
+        # gunicorn-ও এটা মানে; session_cache এটা দেখে একাধিক worker-এ নিজেকে বন্ধ করে
+        'WEB_CONCURRENCY': str(config['workers']),
+    })
+    env.update(dict(item.split('=', 1) for item in args.env))
+    command = [sys.executable, os.path.abspath(__file__), '--serve', '--port', str(port),
+               '--workers', str(config['workers']), '--threads', str(config['threads']),
+               '--llm-latency', args.llm_latency, '--llm-chunk-delay', str(args.llm_chunk_delay)]
+    if args.mongo_uri:
+        command += ['--mongo-uri', args.mongo_uri]
+
+    with tempfile.NamedTemporaryFile('w+', suffix='.log', delete=False) as server_log:
+        log_path = server_log.name
+    with open(log_path, 'w', encoding='utf-8') as server_log:
+        process = subprocess.Popen(command, env=env, stdout=server_log, stderr=subprocess.STDOUT,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+    try:
+        if not wait_until_ready(base_url, process):
+            with open(log_path, encoding='utf-8', errors='replace') as log_file:
+                print(log_file.read()[-2000:])
+            raise RuntimeError(f"{config['name']}: সার্ভার চালু হয়নি")
+
+        samples = []
+        started = time.perf_counter()
+        deadline = started + args.warmup + args.duration
+        users = [threading.Thread(target=virtual_user, daemon=True,
+                                  args=(i, base_url, tracker, deadline, args.reply_timeout, samples, args.seed, args.redeliver))
+                 for i in range(args.users)]
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        # কোয়ালেসিং/ডুপ্লিকেটে কতগুলো টার্ন বাঁচল (একাধিক worker থাকলে শুধু একটির হিসাব)
+        time.sleep(1)
+        try:
+            saved_turns = requests.get(f"{base_url}/stats", timeout=5).json().get('saved_turns')
+        except (requests.exceptions.RequestException, ValueError):
+            saved_turns = None
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    measured = [sample for sample in samples if sample['started'] >= started + args.warmup]
+    replied = [sample['latency'] for sample in measured if sample['latency'] is not None]
+    stages, outcomes = stage_breakdown(read_traces(log_path))
+    os.unlink(log_path)
+    return {
+        'config': config['name'],
+        'workers': config['workers'],
+        'threads': config['threads'],
+        'async_webhook': config['async'],
+        'sent': len(measured),
+        'replied': len(replied),
+        'timeouts': len(measured) - len(replied),
+        'throughput_msgs_per_sec': round(len(replied) / args.duration, 2),
+        'latency_ms': latency_summary(replied),
+        'webhook_ack_ms': latency_summary([sample['ack'] for sample in measured]),
+        'scenarios': {name: sum(1 for sample in measured if sample['scenario'] == name) for name, _, _ in SCENARIOS},
+        'server_outcomes': outcomes,
+        'saved_turns': saved_turns,
+        'stages': stages,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_results(results, baseline=None):
+    baseline_by_config = {result['config']: result for result in (baseline or {}).get('results', [])}
+    print(f"\n{'config':<12} {'msg/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'ack p99':>8} {'timeout':>8}  (ms)")
+    for result in results:
+        latency = result['latency_ms']
+        line = (f"{result['config']:<12} {result['throughput_msgs_per_sec']:>8.2f} {latency['p50']:>8.0f} "
+                f"{latency['p95']:>8.0f} {latency['p99']:>8.0f} {result['webhook_ack_ms']['p99']:>8.0f} "
+                f"{result['timeouts']:>8}")
+        previous = baseline_by_config.get(result['config'])
+        if previous and previous['throughput_msgs_per_sec'] and previous['latency_ms']['p95']:
+            throughput_change = result['throughput_msgs_per_sec'] / previous['throughput_msgs_per_sec'] - 1
+            p95_change = latency['p95'] / previous['latency_ms']['p95'] - 1
+            line += f"   বেসলাইনের তুলনায়: msg/s {throughput_change:+.0%}, p95 {p95_change:+.0%}"
+        print(line)
+    for result in results:
+        print(f"\n[{result['config']}] ধাপভিত্তিক সময় (সার্ভার ট্রেস থেকে):")
+        for stage, summary in result['stages'].items():
+            print(f"  {stage:<15} n={summary['count']:<6} avg {summary['avg_ms']:>8.2f} ms   p95 {summary['p95_ms']:>8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="app:app-এর লোড টেস্ট (নকল Graph API, Gemini ও MongoDB দিয়ে)")
+    parser.add_argument('--configs', default=DEFAULT_CONFIGS, help="কমা দিয়ে আলাদা <workers>x<threads>[:async]")
+    parser.add_argument('--users', type=int, default=20, help="একসাথে কথোপকথন চালানো ভার্চুয়াল গ্রাহক")
+    parser.add_argument('--duration', type=float, default=20, help="প্রতি কনফিগারেশনে মাপার সময় (সেকেন্ড)")
+    parser.add_argument('--warmup', type=float, default=3, help="শুরুর এই সময়ের ফল বাদ দেওয়া হবে")
+    parser.add_argument('--reply-timeout', type=float, default=30)
+    parser.add_argument('--llm-latency', default='lognormal:0.6:0.4',
+                        help="প্রথম টোকেনের সময়: fixed:S, uniform:LOW:HIGH বা lognormal:MEDIAN:SIGMA")
+    parser.add_argument('--llm-chunk-delay', type=float, default=0.02)
+    parser.add_argument('--graph-latency', type=float, default=0.05, help="নকল Graph API-র গড় ল্যাটেন্সি")
+    parser.add_argument('--mongo-uri', help="mongomock-এর বদলে লোকাল mongod (chatbot_db-তে লেখে)")
+    parser.add_argument('--redeliver', type=float, default=0.0, help="এই ভগ্নাংশ ওয়েবহুক দুবার পাঠানো হবে")
+    parser.add_argument('--env', action='append', default=[], help="সার্ভারে অতিরিক্ত env, যেমন GEMINI_STREAMING=1")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='bench_load_results.json')
+    parser.add_argument('--baseline', help="আগের ফলাফলের JSON, তুলনার জন্য")
+    # অভ্যন্তরীণ: gunicorn সার্ভার প্রসেস
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--workers', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--threads', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+    if args.mongo_uri and urlsplit(args.mongo_uri).hostname not in ('127.0.0.1', 'localhost'):
+        print("লোড টেস্ট chatbot_db-তে লেখে, তাই শুধু লোকাল mongod-এ চালানো যাবে।")
+        sys.exit(1)
+    if not args.mongo_uri:
+        try:
+            import mongomock
+        except ImportError:
+            print("mongomock ইনস্টল করা নেই: pip install -r requirements-dev.txt (অথবা --mongo-uri দিয়ে লোকাল mongod)")
+            sys.exit(1)
+
+    tracker = ReplyTracker()
+    server, graph_base_url = start_stub_server(latency=args.graph_latency, on_request=tracker.on_request)
+    results = []
+    try:
+        for spec in args.configs.split(','):
+            config = parse_config(spec.strip())
+            print(f"{config['name']} চলছে: {args.users} ভার্চুয়াল গ্রাহক, {args.duration:.0f} সেকেন্ড ...")
+            results.append(run_config(config, args, graph_base_url, tracker))
+    finally:
+        server.shutdown()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+    print_results(results, baseline)
+
+    report = {
+        'generated_at': datetime.utcnow().isoformat() + 'Z',
+        'git_commit': git_commit(),
+        'settings': {key: value for key, value in vars(args).items()
+                     if key not in ('serve', 'port', 'workers', 'threads', 'output', 'baseline')},
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as output_file:
+        json.dump(report, output_file, ensure_ascii=False, indent=2)
+    print(f"\nফলাফল {args.output}-এ সেভ হয়েছে।")
+
+
+if __name__ == '__main__':
+    main()
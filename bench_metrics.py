@@ -0,0 +1,47 @@
+import sys
+import timeit
+
+import metrics
+
+# metrics.timed() আর পুরো ট্রেসের খরচ কত, তা মাপা - ইনস্ট্রুমেন্টেশন যেন নিজেই latency না বাড়ায়
+# ব্যবহার: python bench_metrics.py [প্রতি ধাপে সর্বোচ্চ মাইক্রোসেকেন্ড]
+
+STAGES = ('faq_match', 'history_write', 'history_fetch', 'details_fetch', 'kb_build', 'prompt_build', 'llm_call',
+          'history_write', 'send_message')
+
+
+def empty():
+    pass
+
+
+def one_stage():
+    with metrics.timed('faq_match'):
+        pass
+
+
+def full_trace():
+    # একটি সাধারণ LLM মেসেজের মতো ধাপগুলো, কাজ ছাড়া শুধু ইনস্ট্রুমেন্টেশন
+    metrics.start_trace('bench-sender', 'm_bench')
+    for stage in STAGES:
+        with metrics.timed(stage):
+            pass
+    metrics.annotate(prompt_tokens={'knowledge': 120, 'history': 300})
+    metrics.end_trace('llm')
+
+
+if __name__ == '__main__':
+    limit_us = float(sys.argv[1]) if len(sys.argv) > 1 else 20.0
+    metrics.TRACE_LOGS = False
+    number = 20000
+
+    baseline = timeit.timeit(empty, number=number) / number
+    stage_cost = timeit.timeit(one_stage, number=number) / number - baseline
+    trace_cost = timeit.timeit(full_trace, number=number) / number - baseline
+    render_cost = timeit.timeit(lambda: metrics.render({'webhook_queue': {'depth': 0, 'dropped': 0}}), number=200) / 200
+
+    print(f"timed() প্রতি ধাপে:       {stage_cost * 1e6:.2f} µs")
+    print(f"পুরো ট্রেস ({len(STAGES)} ধাপ):     {trace_cost * 1e6:.2f} µs")
+    print(f"/metrics render:          {render_cost * 1e3:.2f} ms")
+    if stage_cost * 1e6 > limit_us:
+        print(f"প্রতি ধাপের খরচ {limit_us} µs-এর বেশি।")
+        sys.exit(1)
@@ -0,0 +1,72 @@
+import sys
+import timeit
+
+import prompt_builder
+from prompt_builder import EXAMPLES_SECTION, INSTRUCTIONS_SECTION, PERSONA_SECTION, estimate_tokens
+
+# আগের f-string প্রম্পট আর নতুন প্রম্পট বিল্ডারের তৈরি করার সময় ও আকারের তুলনা
+# ব্যবহার: python bench_prompt.py [knowledge এন্ট্রি] [history টার্ন]
+
+MENU = """
+        সম্পূর্ণ মেন্যু লিস্ট:
+        ১) চিকেন রোল ১৫ পিসের প্যাক    ২২৫ টাকা
+        ২) ভেজিটেবল রোল ১৫ পিসের প্যাক ১৫০ টাকা
+        ৩) বিফ রোল ১০ পিসের প্যাক ২৫০ টাকা
+        """
+
+
+def legacy_prompt(message, history, details_context, knowledge_entries):
+    # আগের get_gemini_response-এর মতো: প্রতিবার পুরো প্রম্পট, কোনো সীমা ছাড়া, নতুন থেকে পুরনো ক্রমে হিস্টোরি
+    formatted_history = "\n".join([f"{msg['role']}: {msg['content']}" for msg in reversed(history)])
+    knowledge_base_for_prompt = MENU + "\n\nঅন্যান্য তথ্য:\n" + "\n".join([f"- {info}" for info in knowledge_entries])
+    return f"""
+    {PERSONA_SECTION}
+
+    ### আপনার জ্ঞান (Knowledge Base) ###
+    {knowledge_base_for_prompt}
+
+    ### গ্রাহকের সেভ করা তথ্য ###
+    {details_context}
+
+    {INSTRUCTIONS_SECTION}
+
+    {EXAMPLES_SECTION}
+
+    ### পূর্বের কথোপকথন ###
+    {formatted_history}
+
+    ### নতুন মেসেজ ###
+    user: "{message}"
+    model:
+    """
+
+
+def sample_inputs(knowledge_count, history_turns):
+    knowledge = [f"তথ্য {i}: আমাদের রান্নাঘরে প্রতিদিন তাজা উপকরণ দিয়ে খাবার তৈরি হয়, ডেলিভারি এলাকা {i}" for i in range(knowledge_count)]
+    history = [{'role': 'user' if i % 2 == 0 else 'model',
+                'content': f"মেসেজ {i}: চিকেন রোল আর ভেজিটেবল রোলের দাম ও ডেলিভারির সময় জানতে চাই " * 3}
+               for i in range(history_turns)]
+    details = "এই গ্রাহকের একটি ঠিকানা আমাদের কাছে সেভ করা আছে: " + "বাড়ি ১২, রোড ৫, মিরপুর, ঢাকা " * 20
+    return "চিকেন রোল ২ প্যাক লাগবে, ডেলিভারি চার্জ কত?", history, details, knowledge
+
+
+if __name__ == '__main__':
+    knowledge_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    history_turns = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    message, history, details, knowledge = sample_inputs(knowledge_count, history_turns)
+    number = 2000
+
+    legacy_time = timeit.timeit(lambda: legacy_prompt(message, history, details, knowledge), number=number) / number
+    builder_time = timeit.timeit(
+        lambda: prompt_builder.build_prompt(message, history, details, knowledge, MENU), number=number) / number
+
+    legacy = legacy_prompt(message, history, details, knowledge)
+    built, sections = prompt_builder.build_prompt(message, history, details, knowledge, MENU)
+    # system instruction মোডে স্থির অংশ প্রতি রিকোয়েস্টে প্রম্পটে যায় না, কিন্তু মডেলে পাঠানো হয়
+    static_tokens = prompt_builder.STATIC_TOKENS
+
+    print(f"knowledge এন্ট্রি: {knowledge_count}, history টার্ন: {history_turns}, বাজেট: {prompt_builder.PROMPT_TOKEN_BUDGET}")
+    print(f"{'':<10} {'build_us':>10} {'chars':>10} {'tokens':>10}")
+    print(f"{'legacy':<10} {legacy_time * 1e6:>10.1f} {len(legacy):>10} {estimate_tokens(legacy):>10}")
+    print(f"{'builder':<10} {builder_time * 1e6:>10.1f} {len(built):>10} {estimate_tokens(built):>10}  (+{static_tokens} স্থির টোকেন system instruction-এ)")
+    print("সেকশন:", sections)
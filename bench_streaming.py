@@ -0,0 +1,95 @@
+import random
+import sys
+import time
+
+from streaming import StreamingReplyWriter
+
+# নকল Gemini মডেল দিয়ে blocking আর স্ট্রিমিং পথে গ্রাহকের প্রথম মেসেজ পেতে কত সময় লাগে (TTFB) তার তুলনা
+# ব্যবহার: python bench_streaming.py [রান সংখ্যা] [প্রতি chunk-এ সেকেন্ড]
+
+NORMAL_REPLY = (
+    "অবশ্যই! আপনার দুটি আইটেমের মোট দাম আসছে:\n"
+    "- চিকেন রোল (১ প্যাকেট): ২২৫ টাকা\n- ভেজিটেবল রোল (১ প্যাকেট): ১৫০ টাকা\n"
+    "- ডেলিভারি চার্জ: ৬০ টাকা\n\nসর্বমোট: ২২৫ + ১৫০ + ৬০ = ৪৩৫ টাকা। "
+    "আপনার অর্ডারটি কনফার্ম করার জন্য আপনার নাম, ঠিকানা ও ফোন নম্বর দিন।"
+)
+ORDER_REPLY = "[ORDER_CONFIRMATION]\n[BILL:435]\n[DETAILS:নাম=Rahim, ঠিকানা=Dhaka, ফোন=123]"
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    # Gemini-র মতো: প্রথম টোকেন আসতে first_delay, তারপর প্রতি chunk-এ chunk_delay
+    def __init__(self, reply, first_delay=0.4, chunk_delay=0.05, chunk_size=12):
+        self.reply = reply
+        self.first_delay = first_delay
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+
+    def _chunks(self):
+        return [self.reply[i:i + self.chunk_size] for i in range(0, len(self.reply), self.chunk_size)]
+
+    def generate_content(self, prompt, stream=False):
+        if not stream:
+            time.sleep(self.first_delay + self.chunk_delay * (len(self._chunks()) - 1))
+            return FakeResponse(self.reply)
+        return self._stream()
+
+    def _stream(self):
+        time.sleep(self.first_delay)
+        for i, chunk in enumerate(self._chunks()):
+            if i:
+                time.sleep(self.chunk_delay)
+            yield FakeChunk(chunk)
+
+
+def run_blocking(model):
+    sent = []
+    started = time.perf_counter()
+    text = model.generate_content("prompt").text
+    sent.append((time.perf_counter() - started, text))
+    return sent
+
+
+def run_streaming(model):
+    sent = []
+    started = time.perf_counter()
+    writer = StreamingReplyWriter(lambda text: sent.append((time.perf_counter() - started, text)))
+    for chunk in model.generate_content("prompt", stream=True):
+        writer.feed(chunk.text)
+    writer.finish()
+    return sent
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    chunk_delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    blocking_ttfb, streaming_ttfb, streaming_total = [], [], []
+    for _ in range(runs):
+        model = FakeModel(NORMAL_REPLY, first_delay=random.uniform(0.3, 0.5), chunk_delay=chunk_delay)
+        blocking_ttfb.append(run_blocking(model)[0][0])
+        sent = run_streaming(model)
+        streaming_ttfb.append(sent[0][0])
+        streaming_total.append(sent[-1][0])
+    print(f"blocking  TTFB median: {median(blocking_ttfb) * 1000:.0f} ms")
+    print(f"streaming TTFB median: {median(streaming_ttfb) * 1000:.0f} ms "
+          f"(শেষ অংশ {median(streaming_total) * 1000:.0f} ms)")
+
+    # অর্ডার কনফার্মেশনের উত্তরে কোনো ট্যাগ গ্রাহকের কাছে যাওয়া চলবে না
+    leaked = run_streaming(FakeModel(ORDER_REPLY, first_delay=0, chunk_delay=0, chunk_size=3))
+    print("ORDER ট্যাগ লিক:", "নেই" if not leaked else leaked)
+    if leaked:
+        sys.exit(1)
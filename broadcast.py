@@ -0,0 +1,222 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+import http_client
+
+# --- অফার ব্রডকাস্ট কনফিগারেশন ---
+BROADCAST_GRAPH_URL = os.getenv('BROADCAST_GRAPH_URL', 'https://graph.facebook.com/v18.0/me/messages')
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', '8'))
+# প্রতি সেকেন্ডে সর্বোচ্চ কয়টি মেসেজ পাঠানো হবে (token bucket)
+BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', '20'))
+BROADCAST_BURST = int(os.getenv('BROADCAST_BURST', '20'))
+BROADCAST_BATCH_SIZE = int(os.getenv('BROADCAST_BATCH_SIZE', '100'))
+# এতক্ষণের পুরনো claim অন্য runner নিয়ে নিতে পারবে (আগের runner ক্র্যাশ করেছে ধরে নেওয়া হয়)
+BROADCAST_CLAIM_LEASE = int(os.getenv('BROADCAST_CLAIM_LEASE', '600'))
+# এক রানে এর বেশি টোকেন ছেড়ে দিতে হলে (Graph ডাউন/থ্রটল) রান থেমে যাবে, বাকিগুলো পরের রানে
+BROADCAST_MAX_RELEASES = int(os.getenv('BROADCAST_MAX_RELEASES', '200'))
+# ----------------------------------------------------
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+class BroadcastRunner:
+    # OTN টোকেন ব্যাচে claim করে, সীমিত concurrency ও rate-এ অফার পাঠায়, ফলাফল bulk-এ লেখে
+
+    def __init__(self, tokens_collection, campaigns_collection, access_token, offer_text, campaign_id=None,
+                 graph_url=BROADCAST_GRAPH_URL, concurrency=BROADCAST_CONCURRENCY, rate=BROADCAST_RATE,
+                 burst=BROADCAST_BURST, batch_size=BROADCAST_BATCH_SIZE, dry_run=False):
+        self.tokens_collection = tokens_collection
+        self.campaigns_collection = campaigns_collection
+        self.access_token = access_token
+        self.offer_text = offer_text
+        self.campaign_id = campaign_id or datetime.utcnow().strftime('offer-%Y%m%d-%H%M%S')
+        self.runner_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.graph_url = graph_url
+        self.concurrency = max(1, concurrency)
+        self.bucket = TokenBucket(rate, burst)
+        self.batch_size = max(1, batch_size)
+        self.dry_run = dry_run
+        self.latencies = []
+        self.counts = {'sent': 0, 'failed': 0, 'released': 0}
+        # এই রানে ছেড়ে দেওয়া টোকেন এই রানে আর claim হবে না, পরের রানে চেষ্টা হবে
+        self.released_ids = set()
+
+    # --- টোকেন claim করা ---
+    def _claim_filter(self):
+        stale_cutoff = datetime.utcnow() - timedelta(seconds=BROADCAST_CLAIM_LEASE)
+        # claimed_at None মানে কেউ claim করেনি (ফিল্ড না থাকলেও None মিলে যায়);
+        # db_indexes.py-র unused_claimed_at partial ইনডেক্স এই query-র জন্য
+        claim_filter = {
+            'used': False,
+            '$or': [
+                {'claimed_at': None},
+                {'claimed_at': {'$lt': stale_cutoff}},
+            ],
+        }
+        if self.released_ids:
+            claim_filter['_id'] = {'$nin': list(self.released_ids)}
+        return claim_filter
+
+    def claim_batch(self):
+        # একটি find-এ প্রার্থী _id, একটি update_many-তে claim; update_many-র filter-এ আবার claim শর্ত থাকায়
+        # অন্য runner মাঝখানে কোনোটা নিয়ে নিলে সেটা এখানে বাদ পড়বে, দুই runner একই টোকেন পাবে না
+        while True:
+            candidate_ids = [doc['_id'] for doc in
+                             self.tokens_collection.find(self._claim_filter(), {'_id': 1}).limit(self.batch_size)]
+            if not candidate_ids:
+                return []
+            claim_filter = self._claim_filter()
+            claim_filter['_id'] = {'$in': candidate_ids}
+            result = self.tokens_collection.update_many(
+                claim_filter,
+                {'$set': {'claimed_by': self.runner_id, 'claimed_at': datetime.utcnow(),
+                          'campaign_id': self.campaign_id}})
+            if result.modified_count:
+                return list(self.tokens_collection.find(
+                    {'_id': {'$in': candidate_ids}, 'claimed_by': self.runner_id, 'used': False}))
+
+    def release_own_claims(self):
+        # --resume: এই ক্যাম্পেইনের আগের (ক্র্যাশ করা) রানের অসম্পূর্ণ claim ছেড়ে দেওয়া
+        result = self.tokens_collection.update_many(
+            {'campaign_id': self.campaign_id, 'used': False, 'claimed_by': {'$ne': None}},
+            {'$set': {'claimed_by': None, 'claimed_at': None}})
+        return result.modified_count
+
+    # --- পাঠানো ---
+    def send_one(self, record):
+        self.bucket.acquire()
+        params = {'access_token': self.access_token}
+        headers = {'Content-Type': 'application/json'}
+        data = {
+            'recipient': {'one_time_notif_token': record['token']},
+            'message': {'text': self.offer_text}
+        }
+        started = time.perf_counter()
+        try:
+            response = http_client.post(self.graph_url, endpoint='graph.broadcast', params=params,
+                                        headers=headers, json=data)
+        except Exception as e:
+            return record, 'release', str(e), time.perf_counter() - started
+        elapsed = time.perf_counter() - started
+        if response.status_code == 200:
+            return record, 'sent', None, elapsed
+        if response.status_code >= 500 or response.status_code == 429:
+            # রিট্রাই করেও সার্ভার সমস্যা থাকলে পরের রানে আবার চেষ্টা করার জন্য ছেড়ে দেওয়া
+            return record, 'release', response.text[:500], elapsed
+        if http_client._is_graph_throttle_error(http_client._json_or_none(response)):
+            # Graph থ্রটল 400/403 হিসেবে আসে; টোকেন ঠিক আছে, তাই used নয়, পরে আবার চেষ্টা
+            return record, 'release', response.text[:500], elapsed
+        # অন্য 4xx মানে টোকেনটি অকার্যকর, আগের মতোই used হিসেবে মার্ক করা
+        return record, 'failed', response.text[:500], elapsed
+
+    def _result_update(self, record, outcome, error):
+        now = datetime.utcnow()
+        if outcome == 'release':
+            self.released_ids.add(record['_id'])
+            return UpdateOne({'_id': record['_id'], 'claimed_by': self.runner_id},
+                             {'$set': {'claimed_by': None, 'claimed_at': None, 'last_error': error},
+                              '$inc': {'attempts': 1}})
+        update = {'used': True, 'status': outcome, 'campaign_id': self.campaign_id, 'finished_at': now}
+        if error:
+            update['last_error'] = error
+        return UpdateOne({'_id': record['_id'], 'claimed_by': self.runner_id}, {'$set': update})
+
+    def _checkpoint(self, operations, batch_counts, status='running'):
+        if operations:
+            self.tokens_collection.bulk_write(operations, ordered=False)
+        update = {
+            '$set': {'status': status, 'updated_at': datetime.utcnow(), 'last_runner': self.runner_id},
+            '$setOnInsert': {'offer_text': self.offer_text, 'created_at': datetime.utcnow()},
+        }
+        if batch_counts:
+            update['$inc'] = batch_counts
+        self.campaigns_collection.update_one({'_id': self.campaign_id}, update, upsert=True)
+
+    def run(self, resume=False, records=None):
+        # records দিলে (ড্রাই-রান) Mongo থেকে claim বা কোনো লেখা হবে না
+        started = time.perf_counter()
+        if resume and not self.dry_run:
+            released = self.release_own_claims()
+            print(f"আগের রানের {released}টি অসম্পূর্ণ টোকেন আবার চেষ্টা করা হবে।")
+        pending = list(records) if records is not None else None
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while True:
+                if pending is not None:
+                    batch, pending = pending[:self.batch_size], pending[self.batch_size:]
+                else:
+                    batch = self.claim_batch()
+                if not batch:
+                    break
+                operations = []
+                batch_counts = {'sent': 0, 'failed': 0, 'released': 0}
+                for record, outcome, error, elapsed in executor.map(self.send_one, batch):
+                    self.latencies.append(elapsed)
+                    counter = 'released' if outcome == 'release' else outcome
+                    batch_counts[counter] += 1
+                    if error and outcome != 'sent':
+                        print(f"ব্যর্থতা: {record.get('sender_id')}-কে মেসেজ পাঠানো যায়নি। {error}")
+                    operations.append(self._result_update(record, outcome, error))
+                for key, value in batch_counts.items():
+                    self.counts[key] += value
+                if not self.dry_run:
+                    self._checkpoint(operations, batch_counts)
+                print(f"অগ্রগতি: পাঠানো {self.counts['sent']}, ব্যর্থ {self.counts['failed']}, "
+                      f"পরে চেষ্টা {self.counts['released']}")
+                if self.counts['released'] >= BROADCAST_MAX_RELEASES:
+                    print(f"{self.counts['released']}টি টোকেন পাঠানো যায়নি, Graph সমস্যা ধরে নিয়ে রান থামানো হলো।")
+                    break
+        if not self.dry_run:
+            self._checkpoint([], {}, status='completed' if not self.counts['released'] else 'incomplete')
+        return self.report(time.perf_counter() - started)
+
+    def report(self, elapsed):
+        total = self.counts['sent'] + self.counts['failed'] + self.counts['released']
+        return {
+            'campaign_id': self.campaign_id,
+            'dry_run': self.dry_run,
+            'sent': self.counts['sent'],
+            'failed': self.counts['failed'],
+            'released': self.counts['released'],
+            'elapsed_seconds': round(elapsed, 3),
+            'throughput_per_second': round(total / elapsed, 2) if elapsed else 0.0,
+            'latency_p50_ms': round(_percentile(self.latencies, 50) * 1000, 1),
+            'latency_p95_ms': round(_percentile(self.latencies, 95) * 1000, 1),
+            'latency_p99_ms': round(_percentile(self.latencies, 99) * 1000, 1),
+            'concurrency': self.concurrency,
+            'rate_limit': self.bucket.rate,
+        }
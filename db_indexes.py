@@ -0,0 +1,242 @@
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import certifi
+from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from message_dedup import DEDUP_TTL_SECONDS
+
+# chatbot_db কালেকশনগুলোর ইনডেক্স তৈরি, query-shape অডিট আর বেঞ্চমার্ক
+# ব্যবহার:
+#   python db_indexes.py migrate              # ইনডেক্স তৈরি (অ্যাপ চালুর সময়ও হয়)
+#   python db_indexes.py audit                # প্রতিটি query-তে explain(), COLLSCAN হলে exit code 1
+#   python db_indexes.py archive --days 90    # পুরনো chat_history আর্কাইভ কালেকশনে সরানো
+#   python db_indexes.py bench --db chatbot_bench   # নকল ডেটা দিয়ে ইনডেক্সের আগে/পরে latency
+
+load_dotenv()
+
+# --- কনফিগারেশন ---
+# সেট করা থাকলে এত দিনের পুরনো chat_history Mongo নিজেই মুছে দেবে (TTL ইনডেক্স)
+CHAT_HISTORY_TTL_DAYS = int(os.getenv('CHAT_HISTORY_TTL_DAYS', '0'))
+ARCHIVE_BATCH_SIZE = 1000
+# ----------------------------------------------------
+
+
+def index_specs():
+    # (collection, keys, options) - কোডের প্রতিটি query shape-এর জন্য
+    specs = [
+        # get_chat_history: {'sender_id'} sort timestamp desc; count_documents({'sender_id'})
+        ('chat_history', [('sender_id', ASCENDING), ('timestamp', DESCENDING)], {'name': 'sender_timestamp'}),
+        # find_one / update_one upsert {'sender_id'}
+        ('customer_details', [('sender_id', ASCENDING)], {'name': 'sender_unique', 'unique': True}),
+        ('otn_tokens', [('sender_id', ASCENDING)], {'name': 'sender'}),
+        # ব্রডকাস্ট: অব্যবহৃত টোকেন claim করা, শুধু used=False ডকুমেন্টগুলো ইনডেক্সে থাকবে
+        ('otn_tokens', [('used', ASCENDING), ('claimed_at', ASCENDING)],
+         {'name': 'unused_claimed_at', 'partialFilterExpression': {'used': False}}),
+        ('otn_tokens', [('campaign_id', ASCENDING)], {'name': 'campaign', 'sparse': True}),
+        # ডিউরেবল webhook কিউ রিকভারি: claim না করা/পুরনো claim, created_at ক্রমে
+        ('webhook_queue', [('created_at', ASCENDING)], {'name': 'created_at'}),
+        # ডুপ্লিকেট চেকের mid গুলো Facebook-এর রিট্রাই সময় পার হলে Mongo নিজেই মুছে দেবে
+        ('webhook_dedup', [('seen_at', ASCENDING)], {'name': 'seen_at_ttl', 'expireAfterSeconds': DEDUP_TTL_SECONDS}),
+        # order_pipeline sweep: অসম্পূর্ণ অর্ডার next_attempt_at অনুযায়ী, আর রিপ্লে টুলের status='failed'
+        ('orders', [('status', ASCENDING), ('next_attempt_at', ASCENDING)], {'name': 'status_next_attempt'}),
+        ('orders', [('created_at', DESCENDING)], {'name': 'created_at'}),
+        # শেয়ার্ড উত্তর ক্যাশ: expires_at পার হলে Mongo নিজেই মুছে দেবে (নাম আগের response_cache.init-এর ইনডেক্সের মতোই)
+        ('response_cache', [('expires_at', ASCENDING)], {'name': 'expires_at_1', 'expireAfterSeconds': 0}),
+    ]
+    # archive_chat_history: {'timestamp': {'$lt': cutoff}}; sender_timestamp-এর শুরু sender_id, তাই আলাদা ইনডেক্স।
+    # একই key-তে দুটি ইনডেক্স হয় না, তাই TTL চালু থাকলে সেটাই এই কাজ করে
+    # (পরে TTL চালু করলে আগের 'timestamp' ইনডেক্স ড্রপ করতে হবে)
+    if CHAT_HISTORY_TTL_DAYS:
+        specs.append(('chat_history', [('timestamp', ASCENDING)],
+                      {'name': 'timestamp_ttl', 'expireAfterSeconds': CHAT_HISTORY_TTL_DAYS * 86400}))
+    else:
+        specs.append(('chat_history', [('timestamp', ASCENDING)], {'name': 'timestamp'}))
+    return specs
+
+
+def ensure_indexes(db):
+    created = []
+    for collection_name, keys, options in index_specs():
+        try:
+            created.append(db[collection_name].create_index(keys, **options))
+        except OperationFailure as e:
+            # যেমন customer_details-এ ডুপ্লিকেট sender_id থাকলে unique ইনডেক্স তৈরি হবে না
+            print(f"{collection_name}-এ ইনডেক্স {options.get('name')} তৈরি করতে সমস্যা: {e}")
+    return created
+
+
+def query_shapes(db):
+    # কোডে ব্যবহৃত প্রতিটি query, explain() চালানোর মতো cursor হিসেবে
+    # knowledge_base ও faq কালেকশন ইচ্ছাকৃতভাবে পুরোটা পড়া হয় (ক্যাশ রিবিল্ড), তাই এখানে নেই
+    stale_cutoff = datetime.utcnow() - timedelta(minutes=10)
+    return [
+        ('chat_history: history by sender', lambda: db.chat_history.find({'sender_id': 'x'}).sort('timestamp', -1).limit(6)),
+        ('chat_history: count by sender', lambda: db.chat_history.find({'sender_id': 'x'})),
+        ('chat_history: archive batch', lambda: db.chat_history.find({'timestamp': {'$lt': stale_cutoff}}).limit(ARCHIVE_BATCH_SIZE)),
+        ('customer_details: by sender', lambda: db.customer_details.find({'sender_id': 'x'}).limit(1)),
+        ('otn_tokens: by sender', lambda: db.otn_tokens.find({'sender_id': 'x'})),
+        ('otn_tokens: unused', lambda: db.otn_tokens.find({'used': False})),
+        ('otn_tokens: broadcast claim', lambda: db.otn_tokens.find({
+            'used': False,
+            '$or': [{'claimed_at': None}, {'claimed_at': {'$lt': stale_cutoff}}],
+        }).limit(1)),
+        ('otn_tokens: campaign claims', lambda: db.otn_tokens.find({'campaign_id': 'x', 'used': False, 'claimed_by': {'$ne': None}})),
+        ('webhook_queue: recovery', lambda: db.webhook_queue.find({
+            'failed': {'$ne': True},
+            '$or': [{'claimed_by': None}, {'claimed_at': {'$lt': stale_cutoff}}],
+        }).sort('created_at', 1).limit(1)),
+        ('orders: due for retry', lambda: db.orders.find({
+            'status': {'$in': ['pending', 'retry', 'processing']},
+            'next_attempt_at': {'$lte': datetime.utcnow()},
+            '$or': [{'claimed_at': None}, {'claimed_at': {'$lt': stale_cutoff}}],
+        }).sort('next_attempt_at', 1).limit(50)),
+        ('orders: failed for replay', lambda: db.orders.find({'status': 'failed'})),
+        ('orders: unfinished', lambda: db.orders.find({'status': {'$ne': 'done'}}).sort('created_at', -1).limit(100)),
+        ('orders: unfinished since', lambda: db.orders.find({
+            'status': {'$ne': 'done'}, 'created_at': {'$gte': stale_cutoff},
+        }).sort('created_at', -1).limit(100)),
+    ]
+
+
+def _plan_stages(plan):
+    yield plan.get('stage')
+    if 'inputStage' in plan:
+        yield from _plan_stages(plan['inputStage'])
+    for child in plan.get('inputStages', []):
+        yield from _plan_stages(child)
+    # নতুন query engine (SBE) explain-এ queryPlan-এর নিচে থাকে
+    if 'queryPlan' in plan:
+        yield from _plan_stages(plan['queryPlan'])
+
+
+def audit(db):
+    failures = []
+    for name, make_cursor in query_shapes(db):
+        plan = make_cursor().explain()['queryPlanner']['winningPlan']
+        stages = [stage for stage in _plan_stages(plan) if stage]
+        status = 'COLLSCAN' if 'COLLSCAN' in stages else 'ok'
+        print(f"{status:<9} {name:<36} {' <- '.join(stages)}")
+        if status != 'ok':
+            failures.append(name)
+    return failures
+
+
+def archive_chat_history(db, days):
+    # পুরনো মেসেজগুলো chat_history_archive-এ সরিয়ে মূল কালেকশন ছোট রাখা
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    moved = 0
+    while True:
+        batch = list(db.chat_history.find({'timestamp': {'$lt': cutoff}}).limit(ARCHIVE_BATCH_SIZE))
+        if not batch:
+            break
+        try:
+            db.chat_history_archive.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # duplicate key (11000) মানে আগের রান insert-এর পর delete-এর আগে থেমে গিয়েছিল, ডকুমেন্ট আর্কাইভে আছে
+            if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+                raise
+        db.chat_history.delete_many({'_id': {'$in': [doc['_id'] for doc in batch]}})
+        moved += len(batch)
+    print(f"{moved}টি মেসেজ chat_history_archive-এ সরানো হয়েছে।")
+    return moved
+
+
+# --- বেঞ্চমার্ক ---
+def seed(db, senders, messages_per_sender, tokens):
+    now = datetime.utcnow()
+    for collection_name in ('chat_history', 'customer_details', 'otn_tokens'):
+        db[collection_name].drop()
+    batch = []
+    for s in range(senders):
+        sender_id = f"sender-{s}"
+        for m in range(messages_per_sender):
+            batch.append({'sender_id': sender_id, 'role': 'user' if m % 2 == 0 else 'model',
+                          'content': f"synthetic message {m}", 'timestamp': now - timedelta(minutes=m * 7 + s)})
+            if len(batch) >= 5000:
+                db.chat_history.insert_many(batch)
+                batch = []
+    if batch:
+        db.chat_history.insert_many(batch)
+    db.customer_details.insert_many([{'sender_id': f"sender-{s}", 'name': f"name {s}", 'address': 'Dhaka',
+                                      'phone': '0170000000'} for s in range(senders)])
+    db.otn_tokens.insert_many([{'sender_id': f"sender-{t % senders}", 'token': f"token-{t}",
+                                'used': random.random() < 0.7} for t in range(tokens)])
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    def pick(pct):
+        return samples[min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))] * 1000
+    return pick(50), pick(99)
+
+
+def measure(db, senders, iterations):
+    results = {}
+    shapes = {
+        'chat_history: history by sender': lambda sid: list(db.chat_history.find({'sender_id': sid}).sort('timestamp', -1).limit(6)),
+        'customer_details: by sender': lambda sid: db.customer_details.find_one({'sender_id': sid}),
+        'otn_tokens: by sender': lambda sid: list(db.otn_tokens.find({'sender_id': sid})),
+        'otn_tokens: first unused': lambda sid: db.otn_tokens.find_one({'used': False, 'claimed_at': None}),
+    }
+    for name, run in shapes.items():
+        samples = []
+        for _ in range(iterations):
+            sender_id = f"sender-{random.randrange(senders)}"
+            started = time.perf_counter()
+            run(sender_id)
+            samples.append(time.perf_counter() - started)
+        results[name] = _percentiles(samples)
+    return results
+
+
+def bench(db, senders, messages_per_sender, tokens, iterations):
+    print(f"নকল ডেটা তৈরি হচ্ছে: {senders} গ্রাহক x {messages_per_sender} মেসেজ, {tokens} OTN টোকেন ...")
+    seed(db, senders, messages_per_sender, tokens)
+    before = measure(db, senders, iterations)
+    ensure_indexes(db)
+    after = measure(db, senders, iterations)
+    print(f"\n{'query':<34} {'p50 আগে':>10} {'p99 আগে':>10} {'p50 পরে':>10} {'p99 পরে':>10}  (ms)")
+    for name in before:
+        print(f"{name:<34} {before[name][0]:>10.2f} {before[name][1]:>10.2f} {after[name][0]:>10.2f} {after[name][1]:>10.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="chatbot_db ইনডেক্স ও query অডিট")
+    parser.add_argument('command', choices=['migrate', 'audit', 'archive', 'bench'])
+    parser.add_argument('--uri', default=os.getenv('MONGO_URI'))
+    parser.add_argument('--db', default='chatbot_db')
+    parser.add_argument('--days', type=int, default=90, help="archive: এর চেয়ে পুরনো মেসেজ সরানো হবে")
+    parser.add_argument('--senders', type=int, default=2000)
+    parser.add_argument('--messages', type=int, default=50, help="bench: প্রতি গ্রাহকের মেসেজ")
+    parser.add_argument('--tokens', type=int, default=20000)
+    parser.add_argument('--iterations', type=int, default=500)
+    args = parser.parse_args()
+
+    # Atlas (mongodb+srv) এর জন্য certifi, লোকাল mongod-এ TLS ছাড়া
+    if args.uri and args.uri.startswith('mongodb+srv'):
+        mongo_client = MongoClient(args.uri, tlsCAFile=certifi.where())
+    else:
+        mongo_client = MongoClient(args.uri)
+    database = mongo_client[args.db]
+
+    if args.command == 'migrate':
+        print("তৈরি/নিশ্চিত করা ইনডেক্স:", ", ".join(ensure_indexes(database)))
+    elif args.command == 'audit':
+        failed = audit(database)
+        if failed:
+            print(f"\n{len(failed)}টি query COLLSCAN করছে। আগে 'python db_indexes.py migrate' চালান।")
+            sys.exit(1)
+    elif args.command == 'archive':
+        archive_chat_history(database, args.days)
+    elif args.command == 'bench':
+        if args.db == 'chatbot_db':
+            print("বেঞ্চমার্ক কালেকশন মুছে ফেলে, তাই আসল chatbot_db-তে চালানো যাবে না। --db chatbot_bench দিন।")
+            sys.exit(1)
+        bench(database, args.senders, args.messages, args.tokens, args.iterations)
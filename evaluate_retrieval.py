@@ -0,0 +1,129 @@
+import argparse
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+
+import prompt_builder
+from knowledge_index import KnowledgeIndex, KNOWLEDGE_TOP_K
+from text_utils import normalize_text, tokenize
+
+# রেকর্ড করা কথোপকথনের উপর 'full' আর 'topk' জ্ঞানভান্ডার মোডের তুলনা:
+# প্রম্পটের আকার, আর প্রত্যাশিত তথ্য প্রম্পটে / উত্তরে আছে কিনা।
+#
+# কথোপকথনের ফাইল (JSONL), প্রতি লাইনে:
+#   {"message": "ডেলিভারি চার্জ কত?", "history": [{"role": "user", "content": "..."}],
+#    "expected": ["৬০"], "reference": "রেকর্ড করা উত্তর (ঐচ্ছিক)"}
+# --knowledge না দিলে MONGO_URI থেকে knowledge_base কালেকশন পড়া হবে।
+
+load_dotenv()
+
+
+def load_conversations(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_knowledge(path):
+    if path:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    from pymongo import MongoClient
+    import certifi
+    client = MongoClient(os.getenv('MONGO_URI'), tlsCAFile=certifi.where())
+    return list(client.chatbot_db.knowledge_base.find({}))
+
+
+def contains_all(text, expected):
+    normalized = normalize_text(text)
+    return all(normalize_text(item) in normalized for item in expected)
+
+
+def overlap_f1(answer, reference):
+    answer_tokens = set(tokenize(answer))
+    reference_tokens = set(tokenize(reference))
+    common = len(answer_tokens & reference_tokens)
+    if not common:
+        return 0.0
+    precision = common / len(answer_tokens)
+    recall = common / len(reference_tokens)
+    return 2 * precision * recall / (precision + recall)
+
+
+def load_model():
+    # শুধু --llm দিলে; অ্যাপ import করলে Mongo, worker থ্রেড সব চালু হয়ে যেত
+    import google.generativeai as genai
+    genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+    return genai.GenerativeModel(prompt_builder.GEMINI_MODEL, **prompt_builder.model_options())
+
+
+def evaluate(conversations, docs, top_k, use_llm):
+    model = load_model() if use_llm else None
+    index = KnowledgeIndex()
+    index.sync(docs, 1)
+    all_entries = [doc.get('information', '') for doc in docs]
+
+    results = {mode: {'prompt_chars': 0, 'prompt_tokens': 0, 'knowledge_hits': 0, 'answer_hits': 0, 'answer_f1': 0.0}
+               for mode in ('full', 'topk')}
+    scored = 0
+    for conversation in conversations:
+        message = conversation['message']
+        history = conversation.get('history', [])
+        expected = conversation.get('expected', [])
+        details_context = conversation.get('details_context', "এই গ্রাহকের কোনো তথ্য আমাদের কাছে সেভ করা নেই।")
+
+        recent_user_messages = [msg['content'] for msg in history if msg.get('role') == 'user'][-2:]
+        relevant = index.search(" ".join([message] + recent_user_messages), top_k)
+        entries_by_mode = {
+            'full': all_entries,
+            # অ্যাপের মতোই: কোনো মিল না পেলে পুরো জ্ঞানভান্ডার
+            'topk': [information for information, _score in relevant] or all_entries,
+        }
+        if expected or conversation.get('reference'):
+            scored += 1
+        for mode, entries in entries_by_mode.items():
+            # অ্যাপের মতোই: full মোডে জ্ঞানভান্ডার বাজেটে ছাঁটা হয় না
+            prompt, sections = prompt_builder.build_prompt(message, history, details_context, entries,
+                                                           prompt_builder.FULL_MENU,
+                                                           knowledge_budgeted=(mode != 'full'))
+            stats = results[mode]
+            stats['prompt_chars'] += len(prompt)
+            stats['prompt_tokens'] += sum(sections[key] for key in ('static', 'knowledge', 'details', 'history', 'message'))
+            kept_entries = entries[:len(entries) - sections['knowledge_dropped']]
+            if expected and contains_all(prompt_builder.FULL_MENU + "\n".join(kept_entries), expected):
+                stats['knowledge_hits'] += 1
+            if use_llm:
+                answer = model.generate_content(prompt).text
+                if expected and contains_all(answer, expected):
+                    stats['answer_hits'] += 1
+                if conversation.get('reference'):
+                    stats['answer_f1'] += overlap_f1(answer, conversation['reference'])
+
+    total = len(conversations) or 1
+    report = {'conversations': len(conversations), 'scored': scored, 'top_k': top_k, 'documents': len(docs)}
+    for mode, stats in results.items():
+        report[mode] = {
+            'avg_prompt_chars': round(stats['prompt_chars'] / total, 1),
+            'avg_prompt_tokens': round(stats['prompt_tokens'] / total, 1),
+            'knowledge_recall': round(stats['knowledge_hits'] / scored, 3) if scored else None,
+        }
+        if use_llm:
+            report[mode]['answer_accuracy'] = round(stats['answer_hits'] / scored, 3) if scored else None
+            report[mode]['answer_f1'] = round(stats['answer_f1'] / scored, 3) if scored else None
+    if results['full']['prompt_chars']:
+        report['prompt_size_ratio'] = round(results['topk']['prompt_chars'] / results['full']['prompt_chars'], 3)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="জ্ঞানভান্ডার রিট্রিভাল মূল্যায়ন")
+    parser.add_argument('conversations', help="রেকর্ড করা কথোপকথনের JSONL ফাইল")
+    parser.add_argument('--knowledge', help="knowledge_base ডকুমেন্টের JSON ফাইল")
+    parser.add_argument('--top-k', type=int, default=KNOWLEDGE_TOP_K)
+    parser.add_argument('--llm', action='store_true', help="Gemini দিয়ে উত্তর তৈরি করে নির্ভুলতা মাপা")
+    args = parser.parse_args()
+
+    report = evaluate(load_conversations(args.conversations), load_knowledge(args.knowledge), args.top_k, args.llm)
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    print()
@@ -0,0 +1,147 @@
+import os
+import re
+import threading
+import time
+
+from text_utils import WORD_CHARS, normalize_text
+
+# --- FAQ ম্যাচার কনফিগারেশন ---
+# কত সেকেন্ড পরপর Mongo 'faq' কালেকশন থেকে আবার লোড করা হবে
+FAQ_RELOAD_INTERVAL = float(os.getenv('FAQ_RELOAD_INTERVAL', '300'))
+# ----------------------------------------------------
+
+# Python-এর \b বাংলা কারচিহ্নকে শব্দের সীমানা ধরে ফেলে, তাই নিজস্ব সীমানা
+_BOUNDARY_BEFORE = f'(?<![{WORD_CHARS}])'
+_BOUNDARY_AFTER = f'(?![{WORD_CHARS}])'
+
+_default_entries = []
+_collection = None
+_matcher = None
+_loaded_at = 0.0
+_reload_lock = threading.Lock()
+_stats_lock = threading.Lock()
+
+_stats = {
+    'keyword_hits': 0,
+    'exact_hits': 0,
+    'misses': 0,
+    'reloads': 0,
+    'reload_errors': 0,
+    'keywords': 0,
+    'questions': 0,
+    'compile_time_last': 0.0,
+}
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def compile_matcher(entries):
+    # entries: [{'keywords': [...], 'questions': [...], 'response': '...'}]
+    # keywords মেসেজের যেকোনো জায়গায় আলাদা শব্দ হিসেবে থাকলেই মিলবে,
+    # questions পুরো মেসেজটি (নরমালাইজ করার পর) হুবহু মিললে তবেই
+    started = time.perf_counter()
+    responses = {}
+    exact = {}
+    for entry in entries:
+        response = entry.get('response')
+        if not response:
+            continue
+        for keyword in entry.get('keywords', []):
+            keyword = normalize_text(keyword)
+            if keyword:
+                responses.setdefault(keyword, response)
+        for question in entry.get('questions', []):
+            question = normalize_text(question)
+            if question:
+                exact.setdefault(question, response)
+    pattern = None
+    if responses:
+        # লম্বা keyword আগে, যাতে "thank you" থাকলে "thank" আগে না মিলে যায়
+        alternation = '|'.join(re.escape(keyword) for keyword in sorted(responses, key=len, reverse=True))
+        pattern = re.compile(f'{_BOUNDARY_BEFORE}(?:{alternation}){_BOUNDARY_AFTER}')
+    with _stats_lock:
+        _stats['keywords'] = len(responses)
+        _stats['questions'] = len(exact)
+        _stats['compile_time_last'] = time.perf_counter() - started
+    return {'pattern': pattern, 'responses': responses, 'exact': exact}
+
+
+def entries_from_mapping(faq_responses):
+    # app.py-র পুরনো FAQ_RESPONSES ডিকশনারি ({(keywords...): response}) থেকে entries
+    return [{'keywords': list(keywords), 'response': response} for keywords, response in faq_responses.items()]
+
+
+def _load():
+    global _matcher, _loaded_at
+    entries = list(_default_entries)
+    if _collection is not None:
+        try:
+            entries = list(_collection.find({'enabled': {'$ne': False}})) + entries
+        except Exception as e:
+            _count('reload_errors')
+            print(f"FAQ কালেকশন লোড করতে সমস্যা: {e}")
+    _matcher = compile_matcher(entries)
+    _loaded_at = time.monotonic()
+    _count('reloads')
+
+
+def _background_load():
+    try:
+        _load()
+    finally:
+        _reload_lock.release()
+
+
+def init(default_entries, collection=None):
+    global _default_entries, _collection, _matcher, _loaded_at
+    _default_entries = list(default_entries)
+    _collection = collection
+    # ডিফল্ট FAQ সাথে সাথে কম্পাইল; Mongo থেকে লোড ব্যাকগ্রাউন্ডে, যাতে Mongo না পেলেও অ্যাপ চালু আটকে না থাকে
+    _matcher = compile_matcher(_default_entries)
+    _loaded_at = time.monotonic()
+    if collection is not None:
+        _reload_lock.acquire()
+        threading.Thread(target=_background_load, name='faq-load', daemon=True).start()
+
+
+def reload():
+    with _reload_lock:
+        _load()
+
+
+def _maybe_reload():
+    if _collection is None or time.monotonic() - _loaded_at < FAQ_RELOAD_INTERVAL:
+        return
+    # হট-রিলোড একটাই ব্যাকগ্রাউন্ড থ্রেড করবে, রিকোয়েস্টগুলো পুরনো ম্যাচার দিয়েই উত্তর দেবে
+    if _reload_lock.acquire(blocking=False):
+        if time.monotonic() - _loaded_at >= FAQ_RELOAD_INTERVAL:
+            threading.Thread(target=_background_load, name='faq-reload', daemon=True).start()
+        else:
+            _reload_lock.release()
+
+
+def match(message_text):
+    _maybe_reload()
+    matcher = _matcher
+    if matcher is None:
+        return None
+    normalized = normalize_text(message_text)
+    response = matcher['exact'].get(normalized)
+    if response is not None:
+        _count('exact_hits')
+        return response
+    if matcher['pattern'] is not None:
+        found = matcher['pattern'].search(normalized)
+        if found:
+            _count('keyword_hits')
+            return matcher['responses'][found.group(0)]
+    _count('misses')
+    return None
+
+
+def get_stats():
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,295 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- বাইরের HTTP কলের (Graph API, CallMeBot) কনফিগারেশন ---
+HTTP_POOL_HOSTS = int(os.getenv('HTTP_POOL_HOSTS', '4'))
+# প্রতি host-এ সর্বোচ্চ কয়টি কানেকশন খোলা থাকবে
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '10'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '3'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '10'))
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '3'))
+HTTP_BACKOFF_BASE = float(os.getenv('HTTP_BACKOFF_BASE', '0.5'))
+HTTP_BACKOFF_MAX = float(os.getenv('HTTP_BACKOFF_MAX', '8'))
+# Graph API-র usage হেডার এই শতাংশ ছাড়ালে নতুন কল কিছুক্ষণ থামিয়ে রাখা হবে
+GRAPH_USAGE_THROTTLE_PCT = float(os.getenv('GRAPH_USAGE_THROTTLE_PCT', '90'))
+GRAPH_THROTTLE_PAUSE = float(os.getenv('GRAPH_THROTTLE_PAUSE', '5'))
+# ----------------------------------------------------
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# POST আবার পাঠালে Graph একই মেসেজ দুবার পাঠাতে পারে, তাই এগুলো ছাড়া অন্য মেথড শুধু নিশ্চিত প্রত্যাখ্যানে রিট্রাই হবে
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+# Graph API রেট-লিমিট error code (https://developers.facebook.com/docs/graph-api/overview/rate-limiting)
+GRAPH_THROTTLE_ERROR_CODES = {4, 17, 32, 613, 80001, 80006}
+GRAPH_USAGE_HEADERS = ('x-app-usage', 'x-page-usage', 'x-business-use-case-usage')
+
+_session = None
+_session_lock = threading.Lock()
+_async_client = None
+_stats_lock = threading.Lock()
+_endpoint_stats = {}
+_graph_usage = {'max_pct': 0.0, 'throttled_until': 0.0, 'throttle_events': 0, 'throttle_rejects': 0}
+
+
+class GraphThrottled(requests.RequestException):
+    # Graph থ্রটল শেষ হতে কলারের max_wait-এর চেয়ে বেশি সময় লাগবে, তাই কল পাঠানো হয়নি
+    pass
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # pool_block=True হলে একটা host-এ HTTP_POOL_SIZE-এর বেশি কানেকশন খোলা হবে না
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_SIZE, pool_block=True)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def get_async_client():
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=HTTP_POOL_SIZE * HTTP_POOL_HOSTS,
+                                max_keepalive_connections=HTTP_POOL_SIZE),
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        )
+    return _async_client
+
+
+async def aclose():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+def _endpoint_name(url, endpoint):
+    if endpoint:
+        return endpoint
+    parts = urlsplit(url)
+    return f"{parts.netloc}{parts.path}"
+
+
+def _record(endpoint, elapsed, status=None, error=False, retries=0):
+    with _stats_lock:
+        stats = _endpoint_stats.setdefault(endpoint, {
+            'requests': 0, 'errors': 0, 'retries': 0,
+            'latency_total': 0.0, 'latency_max': 0.0, 'status': {},
+        })
+        stats['requests'] += 1
+        stats['retries'] += retries
+        stats['latency_total'] += elapsed
+        if elapsed > stats['latency_max']:
+            stats['latency_max'] = elapsed
+        if error:
+            stats['errors'] += 1
+        if status is not None:
+            stats['status'][str(status)] = stats['status'].get(str(status), 0) + 1
+
+
+def _is_graph(url):
+    return urlsplit(url).netloc.endswith('facebook.com')
+
+
+def _update_graph_usage(headers):
+    # X-App-Usage / X-Page-Usage: {"call_count": 12, "total_time": 3, ...}
+    # X-Business-Use-Case-Usage: {"<id>": [{"call_count": .., "estimated_time_to_regain_access": ..}]}
+    highest = 0.0
+    regain_minutes = 0
+    for name in GRAPH_USAGE_HEADERS:
+        value = headers.get(name)
+        if not value:
+            continue
+        try:
+            usage = json.loads(value)
+        except ValueError:
+            continue
+        entries = [usage]
+        if name == 'x-business-use-case-usage':
+            entries = [item for items in usage.values() for item in items]
+        for entry in entries:
+            for key in ('call_count', 'total_time', 'total_cputime'):
+                highest = max(highest, float(entry.get(key, 0) or 0))
+            regain_minutes = max(regain_minutes, int(entry.get('estimated_time_to_regain_access', 0) or 0))
+    if not highest and not regain_minutes:
+        return
+    with _stats_lock:
+        _graph_usage['max_pct'] = highest
+        pause = 0.0
+        if regain_minutes:
+            pause = regain_minutes * 60
+        elif highest >= GRAPH_USAGE_THROTTLE_PCT:
+            pause = GRAPH_THROTTLE_PAUSE
+        if pause:
+            _graph_usage['throttled_until'] = max(_graph_usage['throttled_until'], time.monotonic() + pause)
+            _graph_usage['throttle_events'] += 1
+
+
+def graph_wait_time():
+    return max(0.0, _graph_usage['throttled_until'] - time.monotonic())
+
+
+def _is_graph_throttle_error(body):
+    try:
+        code = body.get('error', {}).get('code')
+    except AttributeError:
+        return False
+    return code in GRAPH_THROTTLE_ERROR_CODES
+
+
+def _should_retry(status, body_loader, idempotent):
+    # 429 আর Graph রেট-লিমিট মানে অনুরোধটি প্রসেস হয়নি; 5xx-এ হয়তো হয়েছে, তাই শুধু idempotent কলে রিট্রাই
+    if status == 429 or (idempotent and status in RETRY_STATUS_CODES):
+        return True
+    # Graph রেট-লিমিট 400/403 হিসেবে আসে, তাই body-র error code দেখতে হয়
+    return status in (400, 403) and _is_graph_throttle_error(body_loader())
+
+
+def _backoff(attempt, retry_after=None):
+    if retry_after:
+        try:
+            return min(float(retry_after), HTTP_BACKOFF_MAX)
+        except ValueError:
+            pass
+    # full jitter: 0 থেকে base * 2^attempt এর মধ্যে যেকোনো সময়
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+
+
+def _throttle_wait(endpoint, max_wait, started):
+    wait = graph_wait_time()
+    if wait > max_wait:
+        with _stats_lock:
+            _graph_usage['throttle_rejects'] += 1
+        _record(endpoint, time.perf_counter() - started, error=True)
+        raise GraphThrottled(f"Graph API থ্রটল করা আছে, আরও {wait:.1f} সেকেন্ড")
+    return wait
+
+
+def _json_or_none(response):
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+
+def request(method, url, endpoint=None, retries=None, idempotent=None, max_wait=None, **kwargs):
+    # সব বাইরের sync কল এখান দিয়ে যাবে: পুল করা কানেকশন, টাইমআউট, রিট্রাই আর মেট্রিক্স
+    # idempotent=False (POST-এর ডিফল্ট): শুধু কানেকশন না হলে, 429 বা Graph রেট-লিমিটে রিট্রাই
+    # max_wait: থ্রটল/ব্যাকঅফে এর বেশি ঘুমানো নয়; রিকোয়েস্ট থ্রেড থেকে ছোট মান দিতে হবে
+    endpoint = _endpoint_name(url, endpoint)
+    retries = HTTP_RETRIES if retries is None else retries
+    idempotent = method.upper() in IDEMPOTENT_METHODS if idempotent is None else idempotent
+    max_wait = HTTP_BACKOFF_MAX if max_wait is None else max_wait
+    retry_errors = (requests.ConnectionError, requests.Timeout) if idempotent else requests.ConnectionError
+    kwargs.setdefault('timeout', (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    graph = _is_graph(url)
+    session = get_session()
+    attempt = 0
+    started = time.perf_counter()
+    while True:
+        if graph:
+            wait = _throttle_wait(endpoint, max_wait, started)
+            if wait:
+                time.sleep(wait)
+        try:
+            response = session.request(method, url, **kwargs)
+        except retry_errors:
+            delay = _backoff(attempt)
+            if attempt >= retries or delay > max_wait:
+                _record(endpoint, time.perf_counter() - started, error=True, retries=attempt)
+                raise
+            time.sleep(delay)
+            attempt += 1
+            continue
+        except requests.RequestException:
+            # যেমন POST-এর ReadTimeout: Graph হয়তো মেসেজটি পাঠিয়েছে, আবার পাঠানো নয়
+            _record(endpoint, time.perf_counter() - started, error=True, retries=attempt)
+            raise
+        if graph:
+            _update_graph_usage(response.headers)
+        if attempt < retries and _should_retry(response.status_code, lambda: _json_or_none(response), idempotent):
+            delay = _backoff(attempt, response.headers.get('Retry-After'))
+            if delay <= max_wait:
+                time.sleep(delay)
+                attempt += 1
+                continue
+        _record(endpoint, time.perf_counter() - started, response.status_code,
+                error=response.status_code >= 400, retries=attempt)
+        return response
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+async def async_request(method, url, endpoint=None, retries=None, idempotent=None, max_wait=None, **kwargs):
+    # httpx দিয়ে একই কাজ, asyncio কোড থেকে অনেকগুলো কল একসাথে পাঠানোর জন্য;
+    # এখনও কোনো কলার নেই (অ্যাপ আর broadcast.py থ্রেড দিয়ে sync request() ব্যবহার করে)
+    endpoint = _endpoint_name(url, endpoint)
+    retries = HTTP_RETRIES if retries is None else retries
+    idempotent = method.upper() in IDEMPOTENT_METHODS if idempotent is None else idempotent
+    max_wait = HTTP_BACKOFF_MAX if max_wait is None else max_wait
+    # PoolTimeout হলে অনুরোধ পাঠানোই হয়নি
+    retry_errors = httpx.TransportError if idempotent else (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+    graph = _is_graph(url)
+    client = get_async_client()
+    attempt = 0
+    started = time.perf_counter()
+    while True:
+        if graph:
+            wait = _throttle_wait(endpoint, max_wait, started)
+            if wait:
+                await asyncio.sleep(wait)
+        try:
+            response = await client.request(method, url, **kwargs)
+        except retry_errors:
+            delay = _backoff(attempt)
+            if attempt >= retries or delay > max_wait:
+                _record(endpoint, time.perf_counter() - started, error=True, retries=attempt)
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        except httpx.TransportError:
+            _record(endpoint, time.perf_counter() - started, error=True, retries=attempt)
+            raise
+        if graph:
+            _update_graph_usage(response.headers)
+        if attempt < retries and _should_retry(response.status_code, lambda: _json_or_none(response), idempotent):
+            delay = _backoff(attempt, response.headers.get('Retry-After'))
+            if delay <= max_wait:
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+        _record(endpoint, time.perf_counter() - started, response.status_code,
+                error=response.status_code >= 400, retries=attempt)
+        return response
+
+
+def get_stats():
+    with _stats_lock:
+        endpoints = {}
+        for name, stats in _endpoint_stats.items():
+            endpoints[name] = dict(stats, status=dict(stats['status']))
+            endpoints[name]['latency_avg'] = stats['latency_total'] / stats['requests'] if stats['requests'] else 0.0
+        graph_usage = dict(_graph_usage)
+    graph_usage['throttled_for'] = graph_wait_time()
+    del graph_usage['throttled_until']
+    return {'endpoints': endpoints, 'graph_usage': graph_usage}
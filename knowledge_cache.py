@@ -0,0 +1,167 @@
+import hashlib
+import os
+import threading
+import time
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+# --- জ্ঞানভান্ডার ক্যাশ কনফিগারেশন ---
+KNOWLEDGE_CACHE_TTL = float(os.getenv('KNOWLEDGE_CACHE_TTL', '300'))
+KNOWLEDGE_CHANGE_STREAM = os.getenv('KNOWLEDGE_CHANGE_STREAM', '1') == '1'
+# change stream সাময়িক কারণে (নেটওয়ার্ক, primary বদল) বন্ধ হলে আবার চেষ্টার সর্বোচ্চ বিরতি
+KNOWLEDGE_WATCH_BACKOFF_MAX = float(os.getenv('KNOWLEDGE_WATCH_BACKOFF_MAX', '60'))
+# ----------------------------------------------------
+
+# "$changeStream stage is only supported on replica sets" - standalone MongoDB
+CHANGE_STREAM_UNSUPPORTED_CODES = {40573}
+
+_collection = None
+# snapshot একবার তৈরি হলে আর বদলানো হয় না, পুরোটা একসাথে বদলে দেওয়া হয়
+_snapshot = None
+_stale = True
+_rebuild_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_watcher = None
+
+_stats = {
+    'hits': 0,
+    'misses': 0,
+    'rebuilds': 0,
+    'rebuild_errors': 0,
+    'rebuild_time_total': 0.0,
+    'rebuild_time_last': 0.0,
+    'rebuild_time_max': 0.0,
+    'unchanged_refreshes': 0,
+    'invalidations': 0,
+    'watch_restarts': 0,
+    'change_stream_active': False,
+}
+
+
+def _count(key, amount=1):
+    with _stats_lock:
+        _stats[key] += amount
+
+
+def init(collection):
+    global _collection
+    _collection = collection
+    if KNOWLEDGE_CHANGE_STREAM and collection is not None:
+        _start_watcher()
+
+
+def invalidate():
+    global _stale
+    _stale = True
+    _count('invalidations')
+
+
+def _is_fresh():
+    return (_snapshot is not None and not _stale
+            and time.monotonic() - _snapshot['loaded_at'] < KNOWLEDGE_CACHE_TTL)
+
+
+def content_hash(docs):
+    # জ্ঞানভান্ডারের বিষয়বস্তুর ছাপ: সব প্রসেস আর রিস্টার্টের পরেও একই তথ্যের জন্য একই মান
+    digest = hashlib.sha1()
+    for information in sorted(str(doc.get('information', '')) for doc in docs):
+        digest.update(information.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _rebuild():
+    global _snapshot, _stale
+    started = time.perf_counter()
+    # রিবিল্ড চলাকালীন নতুন পরিবর্তন এলে সেটা হারিয়ে না যায় তাই আগেই stale মুছে ফেলা
+    _stale = False
+    try:
+        docs = list(_collection.find({})) if _collection is not None else []
+    except Exception as e:
+        _stale = True
+        _count('rebuild_errors')
+        print(f"জ্ঞানভান্ডার ক্যাশ রিবিল্ড করতে সমস্যা: {e}")
+        return
+    fingerprint = content_hash(docs)
+    if _snapshot is not None and _snapshot['content_hash'] == fingerprint:
+        # কিছুই বদলায়নি: একই version রেখে শুধু সময় নবায়ন, যাতে উত্তর ক্যাশ ও সার্চ ইনডেক্স অক্ষত থাকে
+        _snapshot = dict(_snapshot, loaded_at=time.monotonic())
+        _count('unchanged_refreshes')
+        return
+    version = _snapshot['version'] + 1 if _snapshot else 1
+    _snapshot = {'version': version, 'content_hash': fingerprint, 'docs': docs, 'loaded_at': time.monotonic()}
+    elapsed = time.perf_counter() - started
+    with _stats_lock:
+        _stats['rebuilds'] += 1
+        _stats['rebuild_time_total'] += elapsed
+        _stats['rebuild_time_last'] = elapsed
+        if elapsed > _stats['rebuild_time_max']:
+            _stats['rebuild_time_max'] = elapsed
+
+
+def get_snapshot():
+    if _is_fresh():
+        _count('hits')
+        return _snapshot
+    _count('misses')
+    # single-flight: একটাই থ্রেড রিবিল্ড করবে, বাকিরা পুরনো snapshot ব্যবহার করবে
+    if _snapshot is not None:
+        if _rebuild_lock.acquire(blocking=False):
+            try:
+                if not _is_fresh():
+                    _rebuild()
+            finally:
+                _rebuild_lock.release()
+        return _snapshot
+    with _rebuild_lock:
+        if not _is_fresh():
+            _rebuild()
+    return _snapshot
+
+
+def _change_stream_unsupported(error):
+    if isinstance(error, OperationFailure):
+        return error.code in CHANGE_STREAM_UNSUPPORTED_CODES
+    # PyMongoError নয় এমন কিছু (যেমন watch() নেই) আবার চেষ্টা করলেও ঠিক হবে না
+    return not isinstance(error, PyMongoError)
+
+
+def _watch_loop():
+    backoff = 1.0
+    while True:
+        try:
+            with _collection.watch() as stream:
+                with _stats_lock:
+                    _stats['change_stream_active'] = True
+                backoff = 1.0
+                for _change in stream:
+                    invalidate()
+        except Exception as e:
+            with _stats_lock:
+                _stats['change_stream_active'] = False
+            if _change_stream_unsupported(e):
+                # standalone MongoDB-তে change stream নেই, তখন শুধু TTL দিয়ে রিফ্রেশ হবে
+                print(f"জ্ঞানভান্ডার change stream বন্ধ, TTL ব্যবহার করা হবে: {e}")
+                return
+            print(f"জ্ঞানভান্ডার change stream বিচ্ছিন্ন, {backoff:.0f} সেকেন্ড পরে আবার চেষ্টা: {e}")
+            _count('watch_restarts')
+            time.sleep(backoff)
+            backoff = min(KNOWLEDGE_WATCH_BACKOFF_MAX, backoff * 2)
+            # বিচ্ছিন্ন থাকার সময়ের পরিবর্তন হারিয়ে যেতে পারে, তাই একবার রিফ্রেশ
+            invalidate()
+
+
+def _start_watcher():
+    global _watcher
+    if _watcher is not None:
+        return
+    _watcher = threading.Thread(target=_watch_loop, name='knowledge-watcher', daemon=True)
+    _watcher.start()
+
+
+def get_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['version'] = _snapshot['version'] if _snapshot else 0
+    stats['ttl'] = KNOWLEDGE_CACHE_TTL
+    return stats
@@ -0,0 +1,103 @@
+import math
+import os
+import threading
+from collections import Counter, defaultdict
+
+from text_utils import tokenize
+
+# --- জ্ঞানভান্ডার রিট্রিভাল কনফিগারেশন ---
+# 'topk' হলে শুধু প্রাসঙ্গিক তথ্য প্রম্পটে যাবে, 'full' হলে আগের মতো সম্পূর্ণ জ্ঞানভান্ডার
+KNOWLEDGE_MODE = os.getenv('KNOWLEDGE_MODE', 'topk')
+KNOWLEDGE_TOP_K = int(os.getenv('KNOWLEDGE_TOP_K', '5'))
+BM25_K1 = 1.5
+BM25_B = 0.75
+# বাংলা শব্দের বিভক্তি (রোল / রোলের / রোলটি) মেলানোর জন্য অক্ষরভিত্তিক n-gram
+NGRAM_SIZE = 3
+# ----------------------------------------------------
+
+
+def _terms(text):
+    terms = []
+    for token in tokenize(text):
+        terms.append(token)
+        if len(token) > NGRAM_SIZE:
+            padded = f'#{token}#'
+            terms.extend('~' + padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1))
+    return terms
+
+
+def _doc_key(doc):
+    return str(doc.get('_id', doc.get('information', '')))
+
+
+class KnowledgeIndex:
+    # information ডকুমেন্টগুলোর উপর BM25 inverted index, ডকুমেন্ট বদলালে শুধু সেটুকুই আপডেট হয়
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._docs = {}
+        self._term_freqs = {}
+        self._lengths = {}
+        self._postings = defaultdict(set)
+        self._total_length = 0
+        self.version = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _add(self, key, doc):
+        text = doc.get('information', '')
+        freqs = Counter(_terms(text))
+        self._docs[key] = text
+        self._term_freqs[key] = freqs
+        self._lengths[key] = sum(freqs.values())
+        self._total_length += self._lengths[key]
+        for term in freqs:
+            self._postings[term].add(key)
+
+    def _remove(self, key):
+        for term in self._term_freqs.pop(key, {}):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.discard(key)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(key, 0)
+        self._docs.pop(key, None)
+
+    def sync(self, docs, version):
+        # জ্ঞানভান্ডার ক্যাশের নতুন snapshot-এর সাথে ইনডেক্স মিলিয়ে নেওয়া
+        if version == self.version:
+            return
+        with self._lock:
+            if version == self.version:
+                return
+            incoming = {_doc_key(doc): doc for doc in docs}
+            for key in list(self._docs):
+                if key not in incoming:
+                    self._remove(key)
+            for key, doc in incoming.items():
+                if self._docs.get(key) != doc.get('information', ''):
+                    self._remove(key)
+                    self._add(key, doc)
+            self.version = version
+
+    def search(self, query, top_k=KNOWLEDGE_TOP_K):
+        query_terms = set(_terms(query))
+        with self._lock:
+            doc_count = len(self._docs)
+            if not doc_count or not query_terms:
+                return []
+            avg_length = self._total_length / doc_count or 1.0
+            scores = defaultdict(float)
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for key in postings:
+                    tf = self._term_freqs[key][term]
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[key] / avg_length)
+                    scores[key] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+            return [(self._docs[key], score) for key, score in ranked]
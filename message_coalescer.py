@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+
+# --- একই গ্রাহকের পরপর আসা মেসেজ একটি টার্নে মেশানোর কনফিগারেশন ---
+# শেষ মেসেজের পর এত সেকেন্ড নতুন মেসেজ না এলে জমানো মেসেজগুলো একসাথে প্রসেস হবে (0 = বন্ধ)
+MESSAGE_COALESCE_WINDOW = float(os.getenv('MESSAGE_COALESCE_WINDOW', '0'))
+# গ্রাহক একটানা লিখতে থাকলেও প্রথম মেসেজের পর এর বেশি অপেক্ষা নয়
+MESSAGE_COALESCE_MAX_WAIT = float(os.getenv('MESSAGE_COALESCE_MAX_WAIT', '4'))
+MESSAGE_COALESCE_MAX_MESSAGES = int(os.getenv('MESSAGE_COALESCE_MAX_MESSAGES', '6'))
+# ----------------------------------------------------
+
+_pending = {}
+_cond = threading.Condition()
+_dispatch = None
+_flusher = None
+
+_stats = {
+    'messages_in': 0,
+    'turns_out': 0,
+    'merged_turns': 0,
+    'turns_saved': 0,
+}
+
+
+def enabled():
+    return MESSAGE_COALESCE_WINDOW > 0
+
+
+def start(dispatch):
+    # dispatch: মেশানো ইভেন্টটি যেখানে যাবে (যেমন work_queue.enqueue_event), দ্রুত ফিরে আসতে হবে
+    global _dispatch, _flusher
+    if _flusher is not None:
+        return
+    _dispatch = dispatch
+    _flusher = threading.Thread(target=_flush_loop, name='message-coalescer', daemon=True)
+    _flusher.start()
+    print(f"মেসেজ কোয়ালেসিং চালু: {MESSAGE_COALESCE_WINDOW} সেকেন্ড উইন্ডো।")
+
+
+def _is_text_message(event):
+    message = event.get('message') or {}
+    return bool(message.get('text')) and not message.get('is_echo') and not message.get('attachments')
+
+
+def merge_events(events):
+    # শেষ ইভেন্টের উপর ভিত্তি করে, সব টেক্সট লাইন ব্রেক দিয়ে জোড়া; আলাদা টেক্সটগুলো 'coalesced'-এ থাকে
+    if len(events) == 1:
+        return events[0]
+    texts = [event['message']['text'] for event in events]
+    merged = dict(events[-1])
+    merged['message'] = dict(events[-1]['message'], text="\n".join(texts))
+    merged['coalesced'] = {'mids': [event['message'].get('mid') for event in events], 'texts': texts}
+    return merged
+
+
+def _emit(events):
+    # _cond ধরে রেখে ডাকতে হবে, যাতে একই গ্রাহকের ইভেন্টের ক্রম ঠিক থাকে
+    _stats['turns_out'] += 1
+    if len(events) > 1:
+        _stats['merged_turns'] += 1
+        _stats['turns_saved'] += len(events) - 1
+    try:
+        _dispatch(merge_events(events))
+    except Exception as e:
+        print(f"মেশানো মেসেজ পাঠাতে সমস্যা: {e}")
+
+
+def submit(event):
+    sender_id = event.get('sender', {}).get('id')
+    with _cond:
+        if not _is_text_message(event):
+            # অপ্ট-ইন, অ্যাটাচমেন্ট ইত্যাদি অপেক্ষা করে না, তবে আগে জমানো মেসেজগুলো আগে যাবে
+            pending = _pending.pop(sender_id, None)
+            if pending:
+                _emit(pending['events'])
+            _dispatch(event)
+            return
+        now = time.monotonic()
+        pending = _pending.get(sender_id)
+        if pending is None:
+            pending = _pending[sender_id] = {'events': [], 'first_at': now}
+        pending['events'].append(event)
+        pending['deadline'] = min(now + MESSAGE_COALESCE_WINDOW, pending['first_at'] + MESSAGE_COALESCE_MAX_WAIT)
+        _stats['messages_in'] += 1
+        if len(pending['events']) >= MESSAGE_COALESCE_MAX_MESSAGES:
+            _emit(_pending.pop(sender_id)['events'])
+        _cond.notify()
+
+
+def _flush_loop():
+    with _cond:
+        while True:
+            now = time.monotonic()
+            for sender_id in [sender_id for sender_id, pending in _pending.items() if pending['deadline'] <= now]:
+                _emit(_pending.pop(sender_id)['events'])
+            next_deadline = min((pending['deadline'] for pending in _pending.values()), default=None)
+            _cond.wait(None if next_deadline is None else max(0.0, next_deadline - now))
+
+
+def get_stats():
+    with _cond:
+        stats = dict(_stats)
+        stats['pending_senders'] = len(_pending)
+    stats['enabled'] = enabled()
+    return stats
@@ -0,0 +1,75 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from pymongo.errors import DuplicateKeyError
+
+# --- ওয়েবহুক ইভেন্টের ডুপ্লিকেট বাদ দেওয়ার কনফিগারেশন ---
+WEBHOOK_DEDUP_ENABLED = os.getenv('WEBHOOK_DEDUP_ENABLED', '1') == '1'
+# মেমরিতে সর্বশেষ কতগুলো mid মনে রাখা হবে
+DEDUP_MEMORY_SIZE = int(os.getenv('DEDUP_MEMORY_SIZE', '10000'))
+# Mongo-তে mid কতক্ষণ থাকবে (TTL ইনডেক্স), Facebook এর মধ্যেই আবার পাঠানো বন্ধ করে
+DEDUP_TTL_SECONDS = int(os.getenv('DEDUP_TTL_SECONDS', str(24 * 3600)))
+# ----------------------------------------------------
+
+_seen = OrderedDict()
+_lock = threading.Lock()
+_collection = None
+
+_stats = {
+    'checked': 0,
+    'duplicates_memory': 0,
+    'duplicates_db': 0,
+    'db_errors': 0,
+}
+
+
+def init(collection):
+    # collection: সব worker/প্রসেসের শেয়ার করা mid তালিকা (_id = mid, seen_at-এ TTL ইনডেক্স)
+    global _collection
+    _collection = collection
+
+
+def _remember(mid):
+    # _lock ধরে রেখে ডাকতে হবে
+    _seen[mid] = True
+    if len(_seen) > DEDUP_MEMORY_SIZE:
+        _seen.popitem(last=False)
+
+
+def is_duplicate(mid):
+    # Facebook টাইমআউটে একই ইভেন্ট আবার পাঠায়; একই mid আগে দেখা হলে True
+    if not WEBHOOK_DEDUP_ENABLED or not mid:
+        return False
+    with _lock:
+        _stats['checked'] += 1
+        if mid in _seen:
+            _seen.move_to_end(mid)
+            _stats['duplicates_memory'] += 1
+            return True
+        _remember(mid)
+    if _collection is None:
+        return False
+    try:
+        _collection.insert_one({'_id': mid, 'seen_at': datetime.utcnow()})
+    except DuplicateKeyError:
+        # অন্য worker বা রিস্টার্টের আগের প্রসেস এটি আগেই নিয়েছে
+        with _lock:
+            _stats['duplicates_db'] += 1
+        return True
+    except Exception as e:
+        # Mongo সমস্যায় মেসেজ হারানোর চেয়ে দুবার উত্তর দেওয়া ভালো
+        print(f"ডুপ্লিকেট চেক Mongo-তে সেভ করতে সমস্যা: {e}")
+        with _lock:
+            _stats['db_errors'] += 1
+    return False
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats['memory_size'] = len(_seen)
+    stats['dropped'] = stats['duplicates_memory'] + stats['duplicates_db']
+    stats['shared'] = _collection is not None
+    return stats
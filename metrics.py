@@ -0,0 +1,184 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# --- মেট্রিক্স ও ট্রেস লগ কনফিগারেশন ---
+TRACE_LOGS = os.getenv('TRACE_LOGS', '1') == '1'
+# সেকেন্ডে latency বাকেট (Prometheus histogram)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# ----------------------------------------------------
+
+# /stats-এ এই key-গুলোর নিচের dict-এর key মেট্রিকের নাম নয়, label (যেমন endpoint="graph.messages")
+LABEL_KEYS = {'endpoints': 'endpoint', 'status': 'status', 'effects': 'effect'}
+# /stats-এর যেসব সংখ্যা বাড়তে-কমতে পারে (gauge); বাকি সব সংখ্যা শুধু বাড়ে, তাই counter
+GAUGE_KEYS = {
+    'workers', 'depth', 'capacity', 'wait_time_max', 'wait_time_avg', 'version', 'ttl', 'rebuild_time_last',
+    'rebuild_time_max', 'keywords', 'questions', 'compile_time_last', 'size', 'hit_rate', 'max_pct', 'throttled_for',
+    'sessions', 'bytes', 'pending_turns', 'max_bytes', 'memory_size', 'pending_senders', 'queue_depth',
+    'latency_max', 'latency_avg',
+}
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_trace_local = threading.local()
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # _lock ধরে রেখে ডাকতে হবে
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+def observe(name, labels, value):
+    key = (name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(value)
+
+
+def inc(name, labels=(), amount=1):
+    key = (name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+@contextmanager
+def timed(stage):
+    # একটি ধাপের সময় histogram-এ আর চলমান ট্রেসে যোগ করা
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        observe('chatbot_stage_seconds', (('stage', stage),), elapsed)
+        trace = getattr(_trace_local, 'trace', None)
+        if trace is not None:
+            trace['stages'].append((stage, round(elapsed * 1000, 2)))
+
+
+# --- প্রতি রিকোয়েস্টের ট্রেস ---
+def start_trace(sender_id, message_id=None):
+    _trace_local.trace = {'sender_id': sender_id, 'mid': message_id, 'started': time.perf_counter(), 'stages': []}
+
+
+def annotate(**fields):
+    trace = getattr(_trace_local, 'trace', None)
+    if trace is not None:
+        trace.setdefault('fields', {}).update(fields)
+
+
+def end_trace(outcome):
+    trace = getattr(_trace_local, 'trace', None)
+    _trace_local.trace = None
+    if trace is None:
+        return
+    elapsed = time.perf_counter() - trace['started']
+    observe('chatbot_event_seconds', (('outcome', outcome),), elapsed)
+    inc('chatbot_events_total', (('outcome', outcome),))
+    if TRACE_LOGS:
+        record = {
+            'trace': 'webhook_event',
+            'sender_id': trace['sender_id'],
+            'mid': trace['mid'],
+            'outcome': outcome,
+            'total_ms': round(elapsed * 1000, 2),
+            'stages': trace['stages'],
+        }
+        record.update(trace.get('fields', {}))
+        print(json.dumps(record, ensure_ascii=False))
+
+
+# --- Prometheus টেক্সট ফরম্যাট ---
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = [(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for key, value in pairs]
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def _metric_name(prefix, key):
+    return f"{prefix}_{''.join(ch if ch.isalnum() else '_' for ch in str(key))}"
+
+
+def _flatten(prefix, value, labels, out, key=None):
+    # /stats-এর nested dict থেকে (নাম, ধরন, label, মান); LABEL_KEYS-এর dict-এর key label হয়ে যায়
+    if isinstance(value, bool):
+        out.append((prefix, 'gauge', labels, int(value)))
+    elif isinstance(value, (int, float)):
+        if key in GAUGE_KEYS:
+            out.append((prefix, 'gauge', labels, value))
+        else:
+            out.append((prefix if prefix.endswith('_total') else f"{prefix}_total", 'counter', labels, value))
+    elif isinstance(value, dict):
+        label = LABEL_KEYS.get(key)
+        for child_key, child in value.items():
+            if label:
+                _flatten(prefix, child, labels + ((label, child_key),), out)
+            else:
+                _flatten(_metric_name(prefix, child_key), child, labels, out, child_key)
+
+
+def render(gauges=None):
+    lines = []
+    with _lock:
+        histograms = {key: (list(h.counts), h.total, h.count, h.buckets) for key, h in _histograms.items()}
+        counters = dict(_counters)
+    typed = set()
+    for (name, labels), (counts, total, count, buckets) in sorted(histograms.items()):
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        cumulative = 0
+        for bound, bucket_count in zip(buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', bound),))} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    for (name, labels), value in sorted(counters.items()):
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    flattened = []
+    for prefix, value in (gauges or {}).items():
+        _flatten(f"chatbot_{prefix}", value, (), flattened, prefix)
+    # একই মেট্রিকের সব label একসাথে, একটাই TYPE লাইনের নিচে
+    grouped = {}
+    for name, kind, labels, value in flattened:
+        grouped.setdefault((name, kind), []).append((labels, value))
+    for (name, kind), samples in grouped.items():
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+def stage_summary():
+    # বেঞ্চমার্কের জন্য: প্রতিটি ধাপের গড় সময় (ms) ও সংখ্যা
+    with _lock:
+        return {dict(labels).get('stage'): {'count': h.count, 'avg_ms': h.total / h.count * 1000 if h.count else 0.0}
+                for (name, labels), h in _histograms.items() if name == 'chatbot_stage_seconds'}
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
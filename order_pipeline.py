@@ -0,0 +1,382 @@
+import argparse
+import os
+import queue
+import re
+import socket
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# অর্ডার কনফার্মেশনের পার্শ্ব-কাজগুলো (গ্রাহকের উত্তর, মালিককে অ্যালার্ট, লেবেল, OTN ...) outbox হিসেবে
+# অর্ডারের সাথেই একটি ডকুমেন্টে সেভ হয়, তারপর worker সেগুলো একসাথে চালায়, ব্যর্থ হলে পরে আবার চেষ্টা করে।
+# ব্যবহার (রিপ্লে টুল):
+#   python order_pipeline.py failed                          # যেসব অর্ডারের কোনো কাজ শেষ হয়নি
+#   python order_pipeline.py replay --order order-m_abc      # একটি অর্ডারের অসম্পূর্ণ কাজ আবার চালানো
+#   python order_pipeline.py replay --since-hours 24 --effect owner_alert
+# রিপ্লে শুধু অবস্থা রিসেট করে, চালু অ্যাপের worker ORDER_SWEEP_INTERVAL-এর মধ্যে কাজগুলো চালাবে।
+
+# --- অর্ডার পাইপলাইন কনফিগারেশন ---
+ORDER_PIPELINE_WORKERS = int(os.getenv('ORDER_PIPELINE_WORKERS', '2'))
+# প্রতিটি কাজ সর্বোচ্চ কতবার চেষ্টা করা হবে, তারপর অর্ডার 'failed' (রিপ্লে লাগবে)
+ORDER_EFFECT_MAX_ATTEMPTS = int(os.getenv('ORDER_EFFECT_MAX_ATTEMPTS', '5'))
+ORDER_RETRY_BASE = float(os.getenv('ORDER_RETRY_BASE', '5'))
+ORDER_RETRY_MAX = float(os.getenv('ORDER_RETRY_MAX', '600'))
+# এত সেকেন্ড পরপর Mongo থেকে বাকি থাকা/রিট্রাইয়ের অর্ডার খোঁজা হয় (রিস্টার্টের পরেও)
+ORDER_SWEEP_INTERVAL = float(os.getenv('ORDER_SWEEP_INTERVAL', '15'))
+# এতক্ষণের পুরনো claim অন্য worker নিয়ে নিতে পারবে (আগের worker ক্র্যাশ করেছে ধরে নেওয়া হয়)
+ORDER_CLAIM_LEASE = int(os.getenv('ORDER_CLAIM_LEASE', '300'))
+ORDER_SWEEP_BATCH = 50
+# ----------------------------------------------------
+
+BILL_RE = re.compile(r'\[BILL:(\d+\.?\d*)\]')
+DETAILS_RE = re.compile(r'\[DETAILS:(.*?)\]')
+DETAIL_FIELDS = {'নাম': 'name', 'ঠিকানা': 'address', 'ফোন': 'phone'}
+# ঠিকানায় কমা থাকতে পারে ("ঠিকানা=Mirpur 10, Dhaka"), তাই কমা নয়, পরিচিত key= চিহ্ন দিয়ে ভাগ করা
+DETAIL_KEY_RE = re.compile(r'(?:^|,)\s*(' + '|'.join(DETAIL_FIELDS) + r')\s*=')
+OPEN_STATUSES = ['pending', 'retry', 'processing']
+
+_collection = None
+# (নাম, ফাংশন, যেসব কাজ আগে শেষ হতে হবে); ফাংশন False ফেরত দিলে বা exception হলে কাজটি ব্যর্থ
+_effects = []
+_queue = queue.Queue()
+_executor = None
+_workers = []
+_worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+_lock = threading.Lock()
+
+_stats = {
+    'created': 0,
+    'duplicates': 0,
+    'inline': 0,
+    'runs': 0,
+    'completed': 0,
+    'retries_scheduled': 0,
+    'failed': 0,
+    'write_errors': 0,
+}
+_effect_stats = {}
+
+
+class PermanentError(Exception):
+    # আবার চেষ্টা করলেও একই ফল হবে (যেমন অর্ডারের তথ্যই ভুল), তাই কাজটি সাথে সাথে 'failed'
+    pass
+
+
+def _count(key, amount=1):
+    with _lock:
+        _stats[key] += amount
+
+
+def init(collection, effects):
+    global _collection, _effects
+    _collection = collection
+    _effects = list(effects)
+    for name, _, _ in _effects:
+        _effect_stats.setdefault(name, {'done': 0, 'errors': 0, 'time_total': 0.0})
+
+
+def start():
+    global _executor
+    if _workers:
+        return
+    _executor = ThreadPoolExecutor(max_workers=max(1, ORDER_PIPELINE_WORKERS) * max(1, len(_effects)),
+                                   thread_name_prefix='order-effect')
+    for i in range(max(1, ORDER_PIPELINE_WORKERS)):
+        worker = threading.Thread(target=_worker_loop, name=f'order-worker-{i}', daemon=True)
+        worker.start()
+        _workers.append(worker)
+
+
+# --- অর্ডার তৈরি (ওয়েবহুক পথে, শুধু একটি write) ---
+def parse_details(details_raw):
+    # "নাম=Rahim, ঠিকানা=Mirpur 10, Dhaka, ফোন=017..." -> {'name': .., 'address': .., 'phone': ..}
+    markers = list(DETAIL_KEY_RE.finditer(details_raw or ''))
+    customer = {}
+    for i, marker in enumerate(markers):
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(details_raw)
+        value = details_raw[marker.end():end].strip()
+        if value:
+            customer[DETAIL_FIELDS[marker.group(1)]] = value
+    return customer
+
+
+def parse_order(bot_response):
+    bill_match = BILL_RE.search(bot_response)
+    details_match = DETAILS_RE.search(bot_response)
+    details_raw = details_match.group(1) if details_match else None
+    customer = parse_details(details_raw)
+    return {
+        'bill': float(bill_match.group(1)) if bill_match else None,
+        'bill_text': bill_match.group(1) if bill_match else None,
+        'details_raw': details_raw,
+        'customer': customer,
+    }
+
+
+def new_order(sender_id, bot_response, source_mid=None, parsed=None):
+    # parsed: আগেই parse_order করা থাকলে (অ্যাপ ট্যাগ পার্সিং আলাদা ধাপ হিসেবে মাপে)
+    now = datetime.utcnow()
+    order = {
+        # একই মেসেজ থেকে দুবার অর্ডার যেন না হয়, তাই mid থেকে _id
+        '_id': f"order-{source_mid}" if source_mid else f"order-{uuid.uuid4().hex}",
+        'sender_id': sender_id,
+        'source_mid': source_mid,
+        'raw_response': bot_response,
+        'status': 'pending',
+        'created_at': now,
+        'updated_at': now,
+        'next_attempt_at': now,
+        'claimed_at': None,
+        'claimed_by': None,
+        'outbox': {name: {'status': 'pending', 'attempts': 0, 'last_error': None, 'done_at': None}
+                   for name, _, _ in _effects},
+    }
+    order.update(parsed if parsed is not None else parse_order(bot_response))
+    return order
+
+
+def _run_inline(order):
+    # নিজের থ্রেডে, effect পুলে নয়: _run_effects নিজেই পুলে কাজ দিয়ে অপেক্ষা করে, পুলের ভেতর থেকে করলে পুল আটকে যায়
+    threading.Thread(target=_run_effects, args=(order, False), name='order-inline', daemon=True).start()
+
+
+def create_order(sender_id, bot_response, source_mid=None, parsed=None):
+    order = new_order(sender_id, bot_response, source_mid, parsed)
+    if _collection is None:
+        # Mongo না থাকলে সংরক্ষণ ছাড়া একবার চালানো
+        _count('inline')
+        _run_inline(order)
+        return order['_id']
+    try:
+        _collection.insert_one(order)
+    except DuplicateKeyError:
+        _count('duplicates')
+        return order['_id']
+    except Exception as e:
+        print(f"অর্ডার {order['_id']} সেভ করতে সমস্যা, সংরক্ষণ ছাড়া চালানো হচ্ছে: {e}")
+        _count('write_errors')
+        _run_inline(order)
+        return order['_id']
+    _count('created')
+    _queue.put(order['_id'])
+    return order['_id']
+
+
+# --- worker ---
+def _due_filter(now):
+    stale_cutoff = now - timedelta(seconds=ORDER_CLAIM_LEASE)
+    return {
+        'status': {'$in': OPEN_STATUSES},
+        'next_attempt_at': {'$lte': now},
+        '$or': [{'claimed_at': None}, {'claimed_at': {'$lt': stale_cutoff}}],
+    }
+
+
+def _worker_loop():
+    while True:
+        try:
+            order_id = _queue.get(timeout=ORDER_SWEEP_INTERVAL)
+        except queue.Empty:
+            order_id = None
+        try:
+            if order_id is not None:
+                process_order(order_id)
+            else:
+                sweep()
+        except Exception as e:
+            print(f"অর্ডার পাইপলাইনে সমস্যা: {e}")
+
+
+def sweep():
+    # রিট্রাইয়ের সময় হয়েছে বা আগের worker শেষ করতে পারেনি এমন অর্ডারগুলো
+    if _collection is None:
+        return 0
+    due = _collection.find(_due_filter(datetime.utcnow()), {'_id': 1}).sort('next_attempt_at', 1).limit(ORDER_SWEEP_BATCH)
+    processed = 0
+    for doc in list(due):
+        if process_order(doc['_id']):
+            processed += 1
+    return processed
+
+
+def process_order(order_id):
+    # find_one_and_update দিয়ে claim, তাই একই অর্ডার দুই worker একসাথে চালাবে না
+    now = datetime.utcnow()
+    order = _collection.find_one_and_update(
+        dict(_due_filter(now), _id=order_id),
+        {'$set': {'status': 'processing', 'claimed_at': now, 'claimed_by': _worker_id}},
+        return_document=ReturnDocument.AFTER)
+    if order is None:
+        return None
+    return _run_effects(order, True)
+
+
+def _run_effect(order, name, function):
+    # (error, permanent) ফেরত দেয়; PermanentError হলে আর রিট্রাই হবে না
+    started = time.perf_counter()
+    permanent = False
+    try:
+        error = 'ব্যর্থ' if function(order) is False else None
+    except PermanentError as e:
+        error, permanent = f"{type(e).__name__}: {e}", True
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - started
+    with _lock:
+        stats = _effect_stats[name]
+        stats['time_total'] += elapsed
+        stats['errors' if error else 'done'] += 1
+    return error, permanent
+
+
+def _save_effect(order, name, error, permanent=False):
+    now = datetime.utcnow()
+    state = order['outbox'][name]
+    state['attempts'] += 1
+    if error is None:
+        state.update(status='done', done_at=now, last_error=None)
+    else:
+        give_up = permanent or state['attempts'] >= ORDER_EFFECT_MAX_ATTEMPTS
+        state.update(status='failed' if give_up else 'pending', last_error=error)
+        print(f"অর্ডার {order['_id']}: '{name}' ব্যর্থ (চেষ্টা {state['attempts']}): {error}")
+    return {f"outbox.{name}": state, 'updated_at': now}
+
+
+def _final_status(order):
+    outbox = order['outbox']
+    open_effects = [(name, after) for name, _, after in _effects if outbox[name]['status'] != 'done']
+    if not open_effects:
+        return 'done'
+    retryable = [name for name, after in open_effects
+                 if outbox[name]['status'] != 'failed' and all(outbox[dep]['status'] != 'failed' for dep in after)]
+    return 'retry' if retryable else 'failed'
+
+
+def _run_effects(order, persist):
+    # যেসব কাজের আগের কাজ শেষ, সেগুলো একসাথে (parallel), তারপর নির্ভরশীলগুলো
+    _count('runs')
+    outbox = order['outbox']
+    for name, _, _ in _effects:
+        # পরে যোগ হওয়া কাজ পুরনো অর্ডারেও চলবে
+        outbox.setdefault(name, {'status': 'pending', 'attempts': 0, 'last_error': None, 'done_at': None})
+    attempted = set()
+    while True:
+        wave = [(name, function) for name, function, after in _effects
+                if name not in attempted and outbox[name]['status'] == 'pending'
+                and all(outbox[dep]['status'] == 'done' for dep in after)]
+        if not wave:
+            break
+        futures = [(name, _executor.submit(_run_effect, order, name, function)) for name, function in wave]
+        for name, future in futures:
+            attempted.add(name)
+            update = _save_effect(order, name, *future.result())
+            if persist:
+                # প্রতিটি কাজ শেষ হওয়ামাত্র লেখা, যাতে ক্র্যাশের পরে সফল কাজ আবার না চলে
+                _collection.update_one({'_id': order['_id']}, {'$set': update})
+
+    status = _final_status(order)
+    now = datetime.utcnow()
+    update = {'status': status, 'updated_at': now, 'claimed_at': None, 'claimed_by': None}
+    if status == 'retry':
+        attempts = max(state['attempts'] for state in outbox.values())
+        update['next_attempt_at'] = now + timedelta(seconds=min(ORDER_RETRY_MAX, ORDER_RETRY_BASE * 2 ** max(0, attempts - 1)))
+    _count({'done': 'completed', 'retry': 'retries_scheduled', 'failed': 'failed'}[status])
+    if persist:
+        _collection.update_one({'_id': order['_id']}, {'$set': update})
+    elif status != 'done':
+        print(f"অর্ডার {order['_id']} সংরক্ষণ ছাড়া চলেছে, অসম্পূর্ণ কাজ আর চেষ্টা করা হবে না।")
+    return status
+
+
+# --- রিপ্লে ---
+def unfinished_orders(collection, since=None, limit=100):
+    query = {'status': {'$ne': 'done'}}
+    if since is not None:
+        query['created_at'] = {'$gte': since}
+    return list(collection.find(query).sort('created_at', -1).limit(limit))
+
+
+def replay(collection, order_id=None, effect=None, since=None):
+    # ব্যর্থ কাজগুলো আবার 'pending' করে অর্ডারটি এখনই রিট্রাইয়ের জন্য তৈরি করা;
+    # effect-এর সাথে অর্ডার আইডি বা সময় দিলে সেই কাজটি আগে সফল হয়ে থাকলেও আবার চলবে (যেমন মালিককে আবার অ্যালার্ট)
+    if order_id:
+        query = {'_id': order_id}
+    elif effect and since is not None:
+        query = {'created_at': {'$gte': since}}
+    elif effect:
+        query = {f"outbox.{effect}.status": {'$ne': 'done'}}
+    else:
+        query = {'status': 'failed'}
+        if since is not None:
+            query['created_at'] = {'$gte': since}
+    replayed = 0
+    for order in collection.find(query):
+        if order['status'] == 'processing':
+            print(f"{order['_id']}: এখন চলছে, বাদ দেওয়া হলো।")
+            continue
+        names = [effect] if effect else [name for name, state in order['outbox'].items() if state['status'] != 'done']
+        names = [name for name in names if name in order['outbox']]
+        if not names:
+            continue
+        update = {'status': 'retry', 'next_attempt_at': datetime.utcnow(), 'claimed_at': None, 'claimed_by': None}
+        for name in names:
+            update[f"outbox.{name}.status"] = 'pending'
+            update[f"outbox.{name}.attempts"] = 0
+        collection.update_one({'_id': order['_id']}, {'$set': update})
+        print(f"{order['_id']}: {', '.join(names)} আবার চালানো হবে।")
+        replayed += 1
+    return replayed
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats['effects'] = {name: dict(values) for name, values in _effect_stats.items()}
+    stats['queue_depth'] = _queue.qsize()
+    stats['shared'] = _collection is not None
+    return stats
+
+
+if __name__ == '__main__':
+    import certifi
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="অর্ডারের ব্যর্থ নোটিফিকেশন/পার্শ্ব-কাজ দেখা ও আবার চালানো")
+    parser.add_argument('command', choices=['failed', 'replay'])
+    parser.add_argument('--uri', default=os.getenv('MONGO_URI'))
+    parser.add_argument('--db', default='chatbot_db')
+    parser.add_argument('--order', help="শুধু এই অর্ডার আইডি")
+    parser.add_argument('--effect', help="শুধু এই কাজ, যেমন owner_alert, customer_reply, date_label, otn_request")
+    parser.add_argument('--since-hours', type=float, help="শুধু এত ঘণ্টার মধ্যের অর্ডার")
+    args = parser.parse_args()
+
+    if args.uri and args.uri.startswith('mongodb+srv'):
+        mongo_client = MongoClient(args.uri, tlsCAFile=certifi.where())
+    else:
+        mongo_client = MongoClient(args.uri)
+    orders = mongo_client[args.db].orders
+    since = datetime.utcnow() - timedelta(hours=args.since_hours) if args.since_hours else None
+
+    if args.command == 'failed':
+        found = unfinished_orders(orders, since)
+        for order in found:
+            problems = [f"{name}({state['attempts']}): {state['last_error']}"
+                        for name, state in order['outbox'].items() if state['status'] != 'done']
+            print(f"{order['_id']}  {order['status']:<10} {order['created_at']:%Y-%m-%d %H:%M}  {order['sender_id']}  "
+                  f"{'; '.join(problems)}")
+        print(f"{len(found)}টি অসম্পূর্ণ অর্ডার।")
+    elif args.command == 'replay':
+        if not args.order and not args.effect and since is None:
+            print("সব ব্যর্থ অর্ডার আবার চালানো হচ্ছে।")
+        count = replay(orders, args.order, args.effect, since)
+        print(f"{count}টি অর্ডার রিট্রাইয়ের জন্য তৈরি, চালু অ্যাপ {ORDER_SWEEP_INTERVAL:.0f} সেকেন্ডের মধ্যে চালাবে।")
+        if not count:
+            sys.exit(1)
@@ -0,0 +1,146 @@
+import math
+import os
+import time
+
+# --- প্রম্পট বিল্ডার কনফিগারেশন ---
+# স্থির অংশটি (ব্যক্তিত্ব, নির্দেশনা, উদাহরণ) Gemini-র system instruction হিসেবে যাবে কিনা
+PROMPT_SYSTEM_INSTRUCTION = os.getenv('PROMPT_SYSTEM_INSTRUCTION', '1') == '1'
+# প্রতিটি প্রম্পটের পরিবর্তনশীল অংশের সর্বোচ্চ আনুমানিক টোকেন
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '3000'))
+PROMPT_MESSAGE_MAX_TOKENS = int(os.getenv('PROMPT_MESSAGE_MAX_TOKENS', '400'))
+PROMPT_DETAILS_MAX_TOKENS = int(os.getenv('PROMPT_DETAILS_MAX_TOKENS', '200'))
+# বাজেট কম পড়লেও অন্তত এতগুলো সাম্প্রতিক টার্ন রাখা হবে (বাজেট ছাড়িয়ে গেলেও)
+PROMPT_MIN_HISTORY_TURNS = 2
+PROMPT_LOG_SECTIONS = os.getenv('PROMPT_LOG_SECTIONS', '1') == '1'
+# ----------------------------------------------------
+
+# --- স্থির অংশ: একবারই তৈরি হয় ---
+PERSONA_SECTION = """### আপনার ব্যক্তিত্ব (Persona) ###
+আপনি "ঘরের খাবার" এর একজন দক্ষ এবং পেশাদার সহকারী। আপনার উত্তর হবে সংক্ষিপ্ত, নির্ভুল এবং সাহায্যকারী।"""
+
+INSTRUCTIONS_SECTION = """### কঠোর নির্দেশনা (Strict Instructions) ###
+1.  **সীমানা:** সর্বদা এবং শুধুমাত্র "আপনার জ্ঞান" এবং "পূর্বের কথোপকথন" এর উপর ভিত্তি করে উত্তর দিন। এর বাইরে একটি শব্দও বলা যাবে না।
+2.  **অজানা প্রশ্ন:** যদি গ্রাহকের প্রশ্নের উত্তর "আপনার জ্ঞান"-এর মধ্যে না থাকে, তাহলে বলুন: "দুঃখিত, এই বিষয়ে আমি নিশ্চিত নই। আপনাকে সাহায্য করার জন্য আমাদের একজন প্রতিনিধি শীঘ্রই আপনার সাথে যোগাযোগ করবে।"
+3.  **ক্রমিক নম্বর বোঝা:** "আপনার জ্ঞান"-এর মধ্যে দেওয়া মেন্যুটি একটি numerised তালিকা। যদি গ্রাহক "১ নম্বর" বা "১ ও ২ নম্বর" বলে, তাহলে আপনাকে অবশ্যই তালিকা থেকে সঠিক আইটেমগুলো শনাক্ত করতে হবে।
+4.  **প্রসঙ্গ বোঝা (সবচেয়ে গুরুত্বপূর্ণ):** যদি আপনার আগের প্রশ্নে আপনি কোনো কনফার্মেশন চেয়ে থাকেন (যেমন: "আপনি কি অর্ডার করতে চান?") এবং গ্রাহক "জ্বি", "হ্যাঁ", "hmm", "ok", "কনফার্ম", "নিতে চাই", "চাই" এই ধরনের কোনো ইতিবাচক উত্তর দেয়, তাহলে প্রশ্নটি পুনরাবৃত্তি না করে অর্ডারের পরবর্তী ধাপে চলে যাবেন (যেমন: বিল হিসাব করা বা ঠিকানা চাওয়া)।
+5.  **হিসাব করা:** যদি গ্রাহক একাধিক আইটেমের মোট দাম জানতে চায়, তাহলে "পূর্বের কথোপকথন" এবং "আপনার জ্ঞান" থেকে আইটেম ও দাম নিয়ে সঠিকভাবে হিসাব করে একটি ব্রেকডাউন সহ মোট বিল দেখাবেন।
+6.  **অর্ডার কনফার্ম করা:** গ্রাহক যখন তার নাম, ঠিকানা এবং ফোন নম্বর দেবে, তখনই অর্ডারটি চূড়ান্তভাবে নিশ্চিত হবে। তখন আপনার উত্তরের শুরুতে অবশ্যই "[ORDER_CONFIRMATION]" ট্যাগটি যোগ করবেন। এরপর "[BILL:মোট_টাকা]" এবং "[DETAILS:নাম=..., ঠিকানা=..., ফোন=...]" ট্যাগগুলো যোগ করবেন।"""
+
+EXAMPLES_SECTION = """### কথোপকথনের উদাহরণ ###
+user: আমার ১ ও ২ নম্বর আইটেম লাগবে।
+model: আপনি কি মেন্যুর ১ নম্বর (চিকেন রোল) এবং ২ নম্বর (ভেজিটেবল রোল) আইটেমগুলো অর্ডার করতে চান?
+user: জ্বি
+model: অবশ্যই! আপনার দুটি আইটেমের মোট দাম আসছে:\n- চিকেন রোল (১ প্যাকেট): ২২৫ টাকা\n- ভেজিটেবল রোল (১ প্যাকেট): ১৫০ টাকা\n- ডেলিভারি চার্জ: ৬০ টাকা\n\nসর্বমোট: ২২৫ + ১৫০ + ৬০ = ৪৩৫ টাকা। আপনার অর্ডারটি কনফার্ম করার জন্য আপনার নাম, ঠিকানা ও ফোন নম্বর দিন।
+user: নাম: Rahim, ঠিকানা: Dhaka, ফোন: 123
+model: [ORDER_CONFIRMATION]\n[BILL:435]\n[DETAILS:নাম=Rahim, ঠিকানা=Dhaka, ফোন=123]"""
+
+SYSTEM_INSTRUCTION = "\n\n".join([PERSONA_SECTION, INSTRUCTIONS_SECTION, EXAMPLES_SECTION])
+
+GEMINI_MODEL = 'gemini-2.5-flash-lite'
+
+# সম্পূর্ণ মেন্যু লিস্ট, জ্ঞানভান্ডারের শুরুতে যোগ করা হয়
+FULL_MENU = """
+        সম্পূর্ণ মেন্যু লিস্ট:
+        ১) চিকেন রোল ১৫ পিসের প্যাক    ২২৫ টাকা
+        ২) ভেজিটেবল রোল ১৫ পিসের প্যাক ১৫০ টাকা
+        ৩) বিফ রোল ১০ পিসের প্যাক ২৫০ টাকা 
+        ... (আপনার সম্পূর্ণ মেন্যু এখানে থাকবে)
+        """
+
+KNOWLEDGE_HEADER = "### আপনার জ্ঞান (Knowledge Base) ###"
+DETAILS_HEADER = "### গ্রাহকের সেভ করা তথ্য ###"
+HISTORY_HEADER = "### পূর্বের কথোপকথন ###"
+MESSAGE_HEADER = "### নতুন মেসেজ ###"
+OTHER_KNOWLEDGE_HEADER = "\n\nঅন্যান্য তথ্য:\n"
+# ----------------------------------------------------
+
+
+def estimate_tokens(text):
+    # আনুমানিক হিসাব: ইংরেজিতে ~৪ অক্ষরে ১ টোকেন, বাংলা/আরবির মতো অন্য লিপিতে ~২ অক্ষরে ১ টোকেন
+    if not text:
+        return 0
+    ascii_chars = len(text.encode('ascii', 'ignore'))
+    return math.ceil(ascii_chars / 4 + (len(text) - ascii_chars) / 2)
+
+
+def truncate_to_tokens(text, max_tokens):
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # বাজেটের মধ্যে থাকা সবচেয়ে লম্বা অংশ binary search দিয়ে খোঁজা
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low].rstrip() + "…"
+
+
+def build_prompt(message, history, details_context, knowledge_entries, menu, budget=PROMPT_TOKEN_BUDGET,
+                 knowledge_budgeted=True):
+    # history: পুরনো থেকে নতুন ক্রমে টার্ন; knowledge_entries: গুরুত্ব অনুযায়ী সাজানো information
+    # অগ্রাধিকার: নতুন মেসেজ > গ্রাহকের তথ্য > মেন্যু > শেষ কয়েকটি টার্ন > জ্ঞানভান্ডার > পুরনো টার্ন
+    # knowledge_budgeted=False (KNOWLEDGE_MODE=full): সব information রাখা হয়, বাজেট শুধু পুরনো টার্নে খাটে
+    started = time.perf_counter()
+    message = truncate_to_tokens(message, PROMPT_MESSAGE_MAX_TOKENS)
+    details_context = truncate_to_tokens(details_context, PROMPT_DETAILS_MAX_TOKENS)
+    remaining = budget - estimate_tokens(message) - estimate_tokens(details_context) - estimate_tokens(menu)
+
+    turns = [f"{msg['role']}: {msg['content']}" for msg in history]
+    turn_tokens = [estimate_tokens(turn) + 1 for turn in turns]
+    kept_from = len(turns)
+    # সবচেয়ে নতুন কয়েকটি টার্ন সবসময় থাকে, বাজেট না থাকলেও
+    while kept_from > max(0, len(turns) - PROMPT_MIN_HISTORY_TURNS):
+        kept_from -= 1
+        remaining -= turn_tokens[kept_from]
+
+    kept_knowledge = []
+    for information in knowledge_entries:
+        line = f"- {information}"
+        cost = estimate_tokens(line) + 1
+        if knowledge_budgeted and cost > remaining:
+            break
+        kept_knowledge.append(line)
+        remaining -= cost
+
+    # বাকি বাজেটে আরও পুরনো টার্ন
+    while kept_from > 0 and turn_tokens[kept_from - 1] <= remaining:
+        kept_from -= 1
+        remaining -= turn_tokens[kept_from]
+
+    knowledge_text = menu + OTHER_KNOWLEDGE_HEADER + "\n".join(kept_knowledge)
+    formatted_history = "\n".join(turns[kept_from:])
+    dynamic = (
+        f"{KNOWLEDGE_HEADER}\n{knowledge_text}\n\n"
+        f"{DETAILS_HEADER}\n{details_context}\n\n"
+        f"{HISTORY_HEADER}\n{formatted_history}\n\n"
+        f"{MESSAGE_HEADER}\nuser: \"{message}\"\nmodel: "
+    )
+    prompt = dynamic if PROMPT_SYSTEM_INSTRUCTION else SYSTEM_INSTRUCTION + "\n\n" + dynamic
+
+    sections = {
+        'static': 0 if PROMPT_SYSTEM_INSTRUCTION else STATIC_TOKENS,
+        'knowledge': estimate_tokens(knowledge_text),
+        'details': estimate_tokens(details_context),
+        'history': estimate_tokens(formatted_history),
+        'message': estimate_tokens(message),
+        'knowledge_dropped': len(knowledge_entries) - len(kept_knowledge),
+        'history_dropped': kept_from,
+        'build_ms': round((time.perf_counter() - started) * 1000, 3),
+    }
+    return prompt, sections
+
+
+def model_options():
+    # genai.GenerativeModel(GEMINI_MODEL, **model_options())
+    return {'system_instruction': SYSTEM_INSTRUCTION} if PROMPT_SYSTEM_INSTRUCTION else {}
+
+
+def log_sections(sender_id, sections):
+    if PROMPT_LOG_SECTIONS:
+        print(f"প্রম্পট টোকেন [{sender_id}]: " + ", ".join(f"{key}={value}" for key, value in sections.items()))
+
+
+# estimate_tokens তৈরি হওয়ার পর স্থির অংশের টোকেন একবারই হিসাব করা
+STATIC_TOKENS = estimate_tokens(SYSTEM_INSTRUCTION)
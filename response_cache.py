@@ -0,0 +1,156 @@
+import hashlib
+import os
+import threading
+from datetime import datetime, timedelta
+
+from cachetools import TTLCache
+
+from text_utils import normalize_text, tokenize
+
+# --- Gemini উত্তর ক্যাশ কনফিগারেশন ---
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', '1') == '1'
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '1000'))
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '3600'))
+# একাধিক gunicorn worker যাতে একই ক্যাশ ব্যবহার করতে পারে, Mongo-তে শেয়ার্ড স্তর
+RESPONSE_CACHE_SHARED = os.getenv('RESPONSE_CACHE_SHARED', '0') == '1'
+RESPONSE_CACHE_MAX_LENGTH = 200
+# ----------------------------------------------------
+
+# এই শব্দগুলো থাকলে উত্তর আগের কথোপকথনের উপর নির্ভর করে ("জ্বি", "২ নম্বর", "ওটা")
+CONTEXT_WORDS = {
+    'জ্বি', 'জি', 'হ্যাঁ', 'হা', 'হুম', 'না', 'ঠিক', 'আচ্ছা', 'কনফার্ম', 'চাই', 'নিব', 'নেব', 'নিতে', 'লাগবে',
+    'এটা', 'ওটা', 'সেটা', 'এইটা', 'ঐটা', 'আগের', 'নম্বর', 'টা', 'টি', 'সবগুলো', 'মোট',
+    'yes', 'no', 'ok', 'okay', 'hmm', 'confirm', 'this', 'that', 'it', 'these', 'those', 'total', 'number', 'ta',
+}
+# ব্যক্তিগত বা অর্ডার-সংক্রান্ত প্রশ্ন, যার উত্তর গ্রাহকভেদে আলাদা
+PERSONAL_WORDS = {
+    'আমার', 'আমি', 'আমাকে', 'ঠিকানা', 'ফোন', 'নাম', 'অর্ডার', 'বিল',
+    'my', 'me', 'i', 'address', 'phone', 'name', 'order', 'bill',
+}
+# শুধু প্রশ্ন/দাম বোঝানো শব্দ; মেসেজে এগুলো ছাড়া আর কিছু না থাকলে ("দাম কত?", "how much")
+# প্রশ্নটি আগের কথোপকথনের কোনো আইটেম নিয়ে, তাই ক্যাশ নয়
+QUESTION_WORDS = {
+    'দাম', 'কত', 'কতো', 'টাকা', 'কি', 'কী', 'কেমন', 'কোথায়', 'কবে', 'কখন', 'কয়টা', 'কয়টি', 'আছে', 'হবে', 'এর', 'র',
+    'বলেন', 'বলুন', 'জানাবেন', 'রেট', 'প্রাইস',
+    'price', 'prices', 'how', 'much', 'many', 'what', 'is', 'are', 'the', 'a', 'of', 'cost', 'rate', 'available',
+    'koto', 'dam', 'daam', 'taka', 'tk', 'ki', 'er', 're', 'ache', 'hobe', 'please', 'plz', 'bolen',
+}
+CONTROL_TAGS = ('[ORDER_CONFIRMATION]', '[BILL:', '[DETAILS:')
+
+_local = TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+_lock = threading.Lock()
+_shared_collection = None
+
+_stats = {
+    'hits_local': 0,
+    'hits_shared': 0,
+    'misses': 0,
+    'stores': 0,
+    'skipped_stateful': 0,
+    'latency_saved_total': 0.0,
+}
+
+
+def _count(key, amount=1):
+    with _lock:
+        _stats[key] += amount
+
+
+def init(shared_collection=None):
+    global _shared_collection
+    if not RESPONSE_CACHE_SHARED or shared_collection is None:
+        return
+    # expires_at-এর TTL ইনডেক্স db_indexes.ensure_indexes ব্যাকগ্রাউন্ডে তৈরি করে, এখানে Mongo কল নেই
+    _shared_collection = shared_collection
+
+
+def _normalize_for_tokens(tokens):
+    return {normalize_text(word) for word in tokens}
+
+
+_CONTEXT_TOKENS = _normalize_for_tokens(CONTEXT_WORDS)
+_PERSONAL_TOKENS = _normalize_for_tokens(PERSONAL_WORDS)
+_QUESTION_TOKENS = _normalize_for_tokens(QUESTION_WORDS)
+
+
+def is_cacheable(message, history):
+    # শুধু এমন প্রশ্ন ক্যাশ হবে যার উত্তর আগের কথোপকথন বা গ্রাহকের তথ্যের উপর নির্ভর করে না
+    if not RESPONSE_CACHE_ENABLED:
+        return False
+    tokens = tokenize(message)
+    stateless = (
+        tokens
+        and len(message) <= RESPONSE_CACHE_MAX_LENGTH
+        and not any(token.isdigit() for token in tokens)
+        and not _CONTEXT_TOKENS.intersection(tokens)
+        and not _PERSONAL_TOKENS.intersection(tokens)
+        # অন্তত একটি বিষয়বস্তুর শব্দ (আইটেম, ডেলিভারি ...) লাগবে, নইলে প্রশ্নটি আগের প্রসঙ্গের উপর নির্ভরশীল
+        and not set(tokens) <= _QUESTION_TOKENS
+    )
+    if stateless:
+        # বট যদি কোনো প্রশ্ন করে উত্তরের অপেক্ষায় থাকে, তাহলে নতুন মেসেজটি সেই প্রশ্নের উত্তর হতে পারে
+        last_model_turn = next((msg for msg in reversed(history) if msg.get('role') == 'model'), None)
+        if last_model_turn and (last_model_turn.get('content') or '').rstrip().endswith(('?', '？')):
+            stateless = False
+    if not stateless:
+        _count('skipped_stateful')
+    return bool(stateless)
+
+
+def make_key(message, knowledge_fingerprint):
+    # knowledge_fingerprint: জ্ঞানভান্ডারের কনটেন্ট হ্যাশ, যাতে সব worker একই key পায় আর কনটেন্ট বদলালে পুরনো উত্তর বাদ যায়
+    raw = f"{knowledge_fingerprint}\x00{normalize_text(message)}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def get(key):
+    with _lock:
+        entry = _local.get(key)
+    if entry is not None:
+        _count('hits_local')
+        _count('latency_saved_total', entry['latency'])
+        return entry['response']
+    if _shared_collection is not None:
+        try:
+            doc = _shared_collection.find_one({'_id': key, 'expires_at': {'$gt': datetime.utcnow()}})
+        except Exception as e:
+            print(f"শেয়ার্ড উত্তর ক্যাশ পড়তে সমস্যা: {e}")
+            doc = None
+        if doc:
+            entry = {'response': doc['response'], 'latency': doc.get('latency', 0.0)}
+            with _lock:
+                _local[key] = entry
+            _count('hits_shared')
+            _count('latency_saved_total', entry['latency'])
+            return entry['response']
+    _count('misses')
+    return None
+
+
+def put(key, response, latency):
+    if not response or any(tag in response for tag in CONTROL_TAGS):
+        return
+    entry = {'response': response, 'latency': latency}
+    with _lock:
+        _local[key] = entry
+    _count('stores')
+    if _shared_collection is not None:
+        try:
+            _shared_collection.replace_one(
+                {'_id': key},
+                {'response': response, 'latency': latency,
+                 'expires_at': datetime.utcnow() + timedelta(seconds=RESPONSE_CACHE_TTL)},
+                upsert=True)
+        except Exception as e:
+            print(f"শেয়ার্ড উত্তর ক্যাশে লিখতে সমস্যা: {e}")
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats['size'] = len(_local)
+    hits = stats['hits_local'] + stats['hits_shared']
+    lookups = hits + stats['misses']
+    stats['hit_rate'] = hits / lookups if lookups else 0.0
+    stats['shared'] = _shared_collection is not None
+    return stats
@@ -1,12 +1,16 @@
 import os
-import requests
+import argparse
+import json
 from dotenv import load_dotenv
 from pymongo import MongoClient
 
+import broadcast
+from stub_graph_server import start_stub_server
+
 # .env ফাইল থেকে Environment Variables লোড করার জন্য
 load_dotenv()
 
-# Environment Variables থেকে Key এবং Token গুলো নেওয়া
+# Environment Variables থেকে Key এবং Token গুলো নেওয়া
 FACEBOOK_PAGE_ACCESS_TOKEN = os.getenv('FACEBOOK_PAGE_ACCESS_TOKEN')
 MONGO_URI = os.getenv('MONGO_URI')
 
@@ -15,59 +19,61 @@ try:
     client = MongoClient(MONGO_URI)
     db = client.chatbot_db
     otn_tokens_collection = db.otn_tokens
+    broadcast_campaigns_collection = db.broadcast_campaigns
     print("MongoDB ডেটাবেসের সাথে সফলভাবে সংযুক্ত।")
 except Exception as e:
     print(f"MongoDB সংযোগে সমস্যা: {e}")
     exit()
 
-def send_offer_message(offer_text):
-    # ডেটাবেস থেকে সব অব্যবহৃত টোকেন খুঁজে বের করা
-    tokens_to_use = otn_tokens_collection.find({'used': False})
-    
-    success_count = 0
-    failure_count = 0
+def send_offer_message(offer_text, campaign_id=None, resume=False, **options):
+    runner = broadcast.BroadcastRunner(otn_tokens_collection, broadcast_campaigns_collection,
+                                       FACEBOOK_PAGE_ACCESS_TOKEN, offer_text, campaign_id=campaign_id, **options)
+    report = runner.run(resume=resume)
 
-    for record in tokens_to_use:
-        recipient_id = record['sender_id']
-        otn_token = record['token']
-        
-        # Facebook Graph API-তে মেসেজ পাঠানোর জন্য রিকোয়েস্ট তৈরি
-        params = {'access_token': FACEBOOK_PAGE_ACCESS_TOKEN}
-        headers = {'Content-Type': 'application/json'}
-        data = {
-            'recipient': {'one_time_notif_token': otn_token},
-            'message': {'text': offer_text}
-        }
-        
-        try:
-            response = requests.post('https://graph.facebook.com/v18.0/me/messages', params=params, headers=headers, json=data)
-            
-            if response.status_code == 200:
-                print(f"সফলভাবে {recipient_id}-কে অফার পাঠানো হয়েছে।")
-                # টোকেনটিকে 'used' হিসেবে মার্ক করা
-                otn_tokens_collection.update_one({'_id': record['_id']}, {'$set': {'used': True}})
-                success_count += 1
-            else:
-                print(f"ব্যর্থতা: {recipient_id}-কে মেসেজ পাঠানো যায়নি। Response: {response.json()}")
-                # যদি টোকেনটি inválido হয়, তবে সেটিকেও used হিসেবে মার্ক করা যেতে পারে
-                otn_tokens_collection.update_one({'_id': record['_id']}, {'$set': {'used': True}})
-                failure_count += 1
+    print(f"\nপ্রক্রিয়া সম্পন্ন।")
+    print(f"সফলভাবে পাঠানো হয়েছে: {report['sent']} জনকে।")
+    print(f"ব্যর্থ হয়েছে: {report['failed']} জনের ক্ষেত্রে।")
+    if report['released']:
+        print(f"পরে আবার চেষ্টা করা হবে (--resume --campaign {report['campaign_id']}): {report['released']} জন।")
+    return report
 
-        except Exception as e:
-            print(f"একটি ত্রুটি ঘটেছে: {e}")
-            failure_count += 1
-            
-    print(f"\nপ্রক্রিয়া সম্পন্ন।")
-    print(f"সফলভাবে পাঠানো হয়েছে: {success_count} জনকে।")
-    print(f"ব্যর্থ হয়েছে: {failure_count} জনের ক্ষেত্রে।")
+def dry_run_offer_message(offer_text, synthetic=0, limit=1000, latency=0.05, error_rate=0.0, **options):
+    # আসল Facebook-এ কিছু না পাঠিয়ে লোকাল নকল Graph সার্ভারে পাঠানো; ডেটাবেসে কিছু লেখা হয় না
+    server, base_url = start_stub_server(latency=latency, error_rate=error_rate)
+    if synthetic:
+        records = [{'_id': i, 'sender_id': f'dry-{i}', 'token': f'dry-token-{i}'} for i in range(synthetic)]
+    else:
+        records = list(otn_tokens_collection.find({'used': False}).limit(limit))
+    runner = broadcast.BroadcastRunner(None, None, 'dry-run-token', offer_text,
+                                       graph_url=f"{base_url}/v18.0/me/messages", dry_run=True, **options)
+    report = runner.run(records=records)
+    server.shutdown()
+    return report
 
 
 if __name__ == '__main__':
-    # এই স্ক্রিপ্টটি টার্মিনাল থেকে চালানোর সময় অফারের মেসেজটি দিতে হবে
-    import sys
-    if len(sys.argv) > 1:
-        message = sys.argv[1]
-        send_offer_message(message)
-    else:
-        print("ব্যবহার: python send_offer.py \"আপনার অফারের মেসেজ এখানে লিখুন\"")
+    # এই স্ক্রিপ্টটি টার্মিনাল থেকে চালানোর সময় অফারের মেসেজটি দিতে হবে
+    parser = argparse.ArgumentParser(description="OTN টোকেন ব্যবহার করে অফার ব্রডকাস্ট")
+    parser.add_argument('message', help="আপনার অফারের মেসেজ")
+    parser.add_argument('--campaign', help="ক্যাম্পেইন আইডি (আবার চালু করতে একই আইডি দিন)")
+    parser.add_argument('--resume', action='store_true', help="এই ক্যাম্পেইনের আগের অসম্পূর্ণ রান থেকে চালু করা")
+    parser.add_argument('--concurrency', type=int, default=broadcast.BROADCAST_CONCURRENCY)
+    parser.add_argument('--rate', type=float, default=broadcast.BROADCAST_RATE, help="প্রতি সেকেন্ডে সর্বোচ্চ মেসেজ")
+    parser.add_argument('--batch-size', type=int, default=broadcast.BROADCAST_BATCH_SIZE)
+    parser.add_argument('--dry-run', action='store_true', help="লোকাল নকল Graph সার্ভারে পাঠানো")
+    parser.add_argument('--synthetic', type=int, default=0, help="ড্রাই-রানে এতগুলো নকল টোকেন ব্যবহার করা")
+    parser.add_argument('--stub-latency', type=float, default=0.05)
+    parser.add_argument('--stub-error-rate', type=float, default=0.0)
+    parser.add_argument('--report', help="থ্রুপুট রিপোর্ট JSON ফাইলে সেভ করা")
+    args = parser.parse_args()
 
+    options = {'concurrency': args.concurrency, 'rate': args.rate, 'batch_size': args.batch_size}
+    if args.dry_run:
+        report = dry_run_offer_message(args.message, synthetic=args.synthetic, latency=args.stub_latency,
+                                       error_rate=args.stub_error_rate, **options)
+    else:
+        report = send_offer_message(args.message, campaign_id=args.campaign, resume=args.resume, **options)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,267 @@
+import atexit
+import os
+import shlex
+import sys
+import threading
+from collections import OrderedDict, deque
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+# --- প্রতি গ্রাহকের কথোপকথন ক্যাশ কনফিগারেশন ---
+SESSION_CACHE_ENABLED = os.getenv('SESSION_CACHE_ENABLED', '1') == '1'
+# ক্যাশ প্রতি প্রসেসে আলাদা; একাধিক worker থাকলে একই গ্রাহকের মেসেজ অন্য worker-এ গেলে পুরনো হিস্টোরি দেখাবে।
+# তাই একাধিক worker ধরা পড়লে ক্যাশ বন্ধ হয়, যদি না sticky রাউটিং নিশ্চিত করে এটা 1 করা হয়
+SESSION_CACHE_MULTI_WORKER = os.getenv('SESSION_CACHE_MULTI_WORKER', '0') == '1'
+SESSION_HISTORY_TURNS = int(os.getenv('SESSION_HISTORY_TURNS', '12'))
+# সব সেশন মিলিয়ে আনুমানিক সর্বোচ্চ মেমরি (বাইট), এর বেশি হলে সবচেয়ে পুরনো সেশন বাদ
+SESSION_CACHE_MAX_BYTES = int(os.getenv('SESSION_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+SESSION_FLUSH_INTERVAL = float(os.getenv('SESSION_FLUSH_INTERVAL', '1'))
+SESSION_FLUSH_BATCH = int(os.getenv('SESSION_FLUSH_BATCH', '100'))
+# প্রতিটি টার্ন ও সেশনের dict/deque-এর আনুমানিক অতিরিক্ত খরচ
+TURN_OVERHEAD_BYTES = 200
+SESSION_OVERHEAD_BYTES = 1000
+# ----------------------------------------------------
+
+_MISSING = object()
+
+
+def _worker_count():
+    # gunicorn-এর --workers/-w (কমান্ড লাইন বা GUNICORN_CMD_ARGS), না থাকলে WEB_CONCURRENCY;
+    # gunicorn কনফিগ ফাইলে workers দেওয়া থাকলে এখানে ধরা পড়ে না
+    args = sys.argv[1:] + shlex.split(os.getenv('GUNICORN_CMD_ARGS', ''))
+    count = None
+    for i, arg in enumerate(args):
+        value = None
+        if arg in ('--workers', '-w') and i + 1 < len(args):
+            value = args[i + 1]
+        elif arg.startswith('--workers='):
+            value = arg.split('=', 1)[1]
+        elif arg.startswith('-w') and arg[2:].isdigit():
+            value = arg[2:]
+        if value and value.isdigit():
+            count = int(value)
+    if count is None and os.getenv('WEB_CONCURRENCY', '').isdigit():
+        count = int(os.getenv('WEB_CONCURRENCY'))
+    return count or 1
+
+
+if SESSION_CACHE_ENABLED and not SESSION_CACHE_MULTI_WORKER and _worker_count() > 1:
+    print(f"সেশন ক্যাশ বন্ধ: {_worker_count()}টি worker-এ প্রতি প্রসেসের ক্যাশ পুরনো হিস্টোরি দেখাবে "
+          f"(sticky রাউটিং থাকলে SESSION_CACHE_MULTI_WORKER=1)।")
+    SESSION_CACHE_ENABLED = False
+
+_sessions = OrderedDict()
+_total_bytes = 0
+_lock = threading.Lock()
+
+_collection = None
+_pending = []
+_in_flight = []
+_flush_lock = threading.Lock()
+# একসাথে একটির বেশি ফ্লাশ যেন না চলে (ফ্লাশার থ্রেড আর atexit)
+_flush_run_lock = threading.Lock()
+_flush_event = threading.Event()
+_flusher = None
+
+_stats = {
+    'history_hits': 0,
+    'history_misses': 0,
+    'details_hits': 0,
+    'details_misses': 0,
+    'evictions': 0,
+    'flushes': 0,
+    'flushed_turns': 0,
+    'flush_errors': 0,
+}
+
+
+def _turn_size(turn):
+    return len((turn.get('content') or '').encode('utf-8')) + TURN_OVERHEAD_BYTES
+
+
+def _details_size(details):
+    if not details:
+        return 0
+    return sum(len(str(value).encode('utf-8')) for value in details.values()) + TURN_OVERHEAD_BYTES
+
+
+def _session_size(session):
+    size = SESSION_OVERHEAD_BYTES + sum(_turn_size(turn) for turn in session['turns'])
+    if session['details'] is not _MISSING:
+        size += _details_size(session['details'])
+    return size
+
+
+def _get_session(sender_id, create=False):
+    # _lock ধরে রেখে ডাকতে হবে
+    session = _sessions.get(sender_id)
+    if session is not None:
+        _sessions.move_to_end(sender_id)
+    elif create:
+        session = {'turns': deque(maxlen=SESSION_HISTORY_TURNS), 'history_loaded': False,
+                   'details': _MISSING, 'size': 0}
+        _sessions[sender_id] = session
+    return session
+
+
+def _resize(session):
+    # _lock ধরে রেখে ডাকতে হবে; মেমরি বাজেটের বাইরে গেলে LRU সেশন বাদ দেওয়া
+    global _total_bytes
+    new_size = _session_size(session)
+    _total_bytes += new_size - session['size']
+    session['size'] = new_size
+    while _total_bytes > SESSION_CACHE_MAX_BYTES and len(_sessions) > 1:
+        _evicted_id, evicted = _sessions.popitem(last=False)
+        _total_bytes -= evicted['size']
+        _stats['evictions'] += 1
+
+
+def init(collection):
+    global _collection, _flusher
+    _collection = collection
+    if _flusher is None and collection is not None:
+        _flusher = threading.Thread(target=_flush_loop, name='session-flusher', daemon=True)
+        _flusher.start()
+        atexit.register(flush)
+
+
+# --- কথোপকথনের টার্ন ---
+def record_turn(sender_id, doc):
+    # মেমরিতে সাথে সাথে যোগ, Mongo-তে পরে ব্যাচে লেখা (write-behind)
+    doc.setdefault('_id', ObjectId())
+    turn = {'_id': doc['_id'], 'role': doc['role'], 'content': doc['content']}
+    # আগে pending-এ রাখা, যাতে এর মধ্যে কেউ সেশন লোড করলে টার্নটি বাদ না পড়ে
+    with _flush_lock:
+        _pending.append(doc)
+        should_wake = len(_pending) >= SESSION_FLUSH_BATCH
+    with _lock:
+        session = _get_session(sender_id)
+        # হিস্টোরি লোড চলার সময়ও যোগ করা, লোড শেষে _id দিয়ে মিলিয়ে নেওয়া হয়
+        if session is not None and all(existing.get('_id') != turn['_id'] for existing in session['turns']):
+            session['turns'].append(turn)
+            _resize(session)
+    if should_wake:
+        _flush_event.set()
+
+
+def _unflushed_turns(sender_id):
+    with _flush_lock:
+        docs = [doc for doc in _in_flight + _pending if doc['sender_id'] == sender_id]
+    return [{'_id': doc['_id'], 'role': doc['role'], 'content': doc['content']} for doc in docs]
+
+
+def get_history(sender_id, limit, loader):
+    # loader(sender_id, limit) Mongo থেকে পুরনো-থেকে-নতুন ক্রমে টার্ন ফেরত দেয়
+    # ফলাফল সবসময় পুরনো থেকে নতুন ক্রমে, শেষ limit টি টার্ন
+    with _lock:
+        session = _get_session(sender_id)
+        if session is not None and session['history_loaded']:
+            _stats['history_hits'] += 1
+            turns = list(session['turns'])
+            return turns[-limit:] if limit else turns
+        _stats['history_misses'] += 1
+        _get_session(sender_id, create=True)
+    # Mongo পড়ার আগেই না-লেখা টার্নগুলোর কপি: loader চলার মধ্যে ফ্লাশ হলে টার্নটি দুই জায়গাতেই না থাকতে পারে
+    unflushed = _unflushed_turns(sender_id)
+    loaded = loader(sender_id, SESSION_HISTORY_TURNS)
+    unflushed += _unflushed_turns(sender_id)
+    with _lock:
+        session = _get_session(sender_id, create=True)
+        if not session['history_loaded']:
+            # Mongo + না-লেখা + লোডের মধ্যে রেকর্ড হওয়া টার্ন, _id দিয়ে ডুপ্লিকেট বাদ
+            turns = []
+            seen = set()
+            for turn in loaded + unflushed + list(session['turns']):
+                if turn.get('_id') not in seen:
+                    seen.add(turn.get('_id'))
+                    turns.append(turn)
+            session['turns'].clear()
+            session['turns'].extend(turns)
+            session['history_loaded'] = True
+            _resize(session)
+        turns = list(session['turns'])
+    return turns[-limit:] if limit else turns
+
+
+# --- গ্রাহকের সেভ করা তথ্য ---
+def get_details(sender_id, loader):
+    with _lock:
+        session = _get_session(sender_id)
+        if session is not None and session['details'] is not _MISSING:
+            _stats['details_hits'] += 1
+            return session['details']
+        _stats['details_misses'] += 1
+    details = loader(sender_id)
+    with _lock:
+        session = _get_session(sender_id, create=True)
+        if session['details'] is _MISSING:
+            session['details'] = details
+            _resize(session)
+        return session['details']
+
+
+def update_details(sender_id, update_data):
+    # save_customer_details Mongo-তে লেখার পর ক্যাশও একই তথ্যে আপডেট করা
+    with _lock:
+        session = _get_session(sender_id)
+        if session is None or session['details'] is _MISSING:
+            return
+        details = dict(session['details'] or {'sender_id': sender_id})
+        details.update(update_data)
+        session['details'] = details
+        _resize(session)
+
+
+# --- write-behind ফ্লাশ ---
+def flush():
+    with _flush_run_lock:
+        _flush_once()
+
+
+def _flush_once():
+    global _pending, _in_flight
+    with _flush_lock:
+        if not _pending or _collection is None:
+            return
+        _in_flight, _pending = _pending[:SESSION_FLUSH_BATCH * 10], _pending[SESSION_FLUSH_BATCH * 10:]
+        batch = _in_flight
+    try:
+        _collection.insert_many(batch, ordered=False)
+        with _lock:
+            _stats['flushes'] += 1
+            _stats['flushed_turns'] += len(batch)
+    except Exception as e:
+        retry = batch
+        if isinstance(e, BulkWriteError):
+            # duplicate key (11000) মানে আগের চেষ্টায় লেখা হয়ে গেছে, শুধু বাকিগুলো আবার চেষ্টা
+            failed_indexes = {error['index'] for error in e.details.get('writeErrors', [])
+                              if error.get('code') != 11000}
+            retry = [doc for i, doc in enumerate(batch) if i in failed_indexes]
+        with _lock:
+            _stats['flush_errors'] += 1
+        print(f"চ্যাট হিস্টোরি ব্যাচে সেভ করতে সমস্যা ({len(retry)}টি আবার চেষ্টা হবে): {e}")
+        with _flush_lock:
+            _pending = retry + _pending
+    finally:
+        with _flush_lock:
+            _in_flight = []
+
+
+def _flush_loop():
+    while True:
+        _flush_event.wait(SESSION_FLUSH_INTERVAL)
+        _flush_event.clear()
+        flush()
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats['sessions'] = len(_sessions)
+        stats['bytes'] = _total_bytes
+    with _flush_lock:
+        stats['pending_turns'] = len(_pending) + len(_in_flight)
+    stats['max_bytes'] = SESSION_CACHE_MAX_BYTES
+    stats['enabled'] = SESSION_CACHE_ENABLED
+    return stats
@@ -0,0 +1,68 @@
+import os
+import re
+
+# --- স্ট্রিমিং উত্তরের কনফিগারেশন ---
+GEMINI_STREAMING = os.getenv('GEMINI_STREAMING', '0') == '1'
+# অন্তত এতগুলো অক্ষর জমলে তবেই একটি সম্পূর্ণ বাক্য/অনুচ্ছেদ পাঠানো হবে, যাতে খুব ছোট ছোট মেসেজ না যায়
+STREAM_FLUSH_MIN_CHARS = int(os.getenv('STREAM_FLUSH_MIN_CHARS', '80'))
+# ----------------------------------------------------
+
+ORDER_TAG = '[ORDER_CONFIRMATION]'
+# দাঁড়ি, প্রশ্নবোধক/বিস্ময়বোধক চিহ্ন, লাইন ব্রেক, অথবা স্পেসের আগের ফুলস্টপ (২২৫.০০ নয়)
+_BOUNDARY_RE = re.compile(r'\n+|[।!?]+|\.(?=\s)')
+_CONTROL_TAG_RE = re.compile(r'\[(?:ORDER_CONFIRMATION|BILL:[^\]]*|DETAILS:[^\]]*)\]')
+
+
+class StreamingReplyWriter:
+    # Gemini-র স্ট্রিম থেকে আসা টেক্সট জমিয়ে সম্পূর্ণ বাক্য হলে send() দিয়ে পাঠায়।
+    # [ORDER_CONFIRMATION] দেখলে আর কিছুই পাঠায় না, আর কোনো কন্ট্রোল ট্যাগ গ্রাহকের কাছে যায় না।
+
+    def __init__(self, send, min_chars=STREAM_FLUSH_MIN_CHARS):
+        self.send = send
+        self.min_chars = min_chars
+        self.buffer = ''
+        self.fed = []
+        self.sent_any = False
+        self.order_detected = False
+
+    @property
+    def text(self):
+        return ''.join(self.fed)
+
+    def feed(self, text):
+        if not text:
+            return
+        self.fed.append(text)
+        if self.order_detected:
+            return
+        self.buffer += text
+        self._flush(final=False)
+
+    def finish(self):
+        if not self.order_detected:
+            self._flush(final=True)
+
+    def _flush(self, final):
+        if ORDER_TAG in self.buffer:
+            self.order_detected = True
+            self.buffer = ''
+            return
+        text = self.buffer
+        # '[' খোলা কিন্তু ']' আসেনি, এটা কোনো ট্যাগের শুরু হতে পারে, তাই আটকে রাখা
+        hold_from = len(text)
+        open_index = text.rfind('[')
+        if not final and open_index != -1 and ']' not in text[open_index:]:
+            hold_from = open_index
+        if final:
+            cut = len(text)
+        else:
+            cut = 0
+            for boundary in _BOUNDARY_RE.finditer(text, 0, hold_from):
+                cut = boundary.end()
+            if cut < self.min_chars:
+                return
+        chunk, self.buffer = text[:cut], text[cut:]
+        chunk = _CONTROL_TAG_RE.sub('', chunk).strip()
+        if chunk:
+            self.send(chunk)
+            self.sent_any = True
@@ -0,0 +1,97 @@
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# লোকাল টেস্ট ও ড্রাই-রানের জন্য Facebook Graph API-র একটি ছোট নকল সার্ভার।
+# যেকোনো POST /.../messages বা /.../label রিকোয়েস্টে Graph-এর মতো উত্তর দেয়।
+# ব্যবহার: python stub_graph_server.py [port] [latency_seconds] [error_rate]
+
+
+class StubGraphHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('X-App-Usage', json.dumps({'call_count': 1, 'total_time': 1, 'total_cputime': 1}))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def do_GET(self):
+        if urlsplit(self.path).path.endswith('/custom_labels'):
+            self._send_json(200, {'data': []})
+        else:
+            self._send_json(200, {'ok': True})
+
+    def do_POST(self):
+        server = self.server
+        body = self._read_json()
+        if server.latency:
+            time.sleep(random.uniform(0.5, 1.5) * server.latency)
+        record = {'path': urlsplit(self.path).path, 'body': body, 'at': time.time()}
+        with server.lock:
+            server.requests.append(record)
+        if server.on_request:
+            server.on_request(record)
+        if server.error_rate and random.random() < server.error_rate:
+            self._send_json(500, {'error': {'message': 'stub error', 'code': 2}})
+            return
+        path = urlsplit(self.path).path
+        if path.endswith('/custom_labels'):
+            self._send_json(200, {'id': uuid.uuid4().hex[:12]})
+        elif path.endswith('/label'):
+            self._send_json(200, {'success': True})
+        else:
+            recipient = body.get('recipient', {})
+            self._send_json(200, {
+                'recipient_id': recipient.get('id', 'otn'),
+                'message_id': f"m_{uuid.uuid4().hex}",
+            })
+
+
+def start_stub_server(port=0, latency=0.0, error_rate=0.0, on_request=None):
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubGraphHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.error_rate = error_rate
+    server.lock = threading.Lock()
+    server.requests = []
+    # প্রতিটি POST আসার সাথে সাথে ডাকা হয় (যেমন লোড টেস্টে উত্তর পৌঁছানোর সময় মাপতে)
+    server.on_request = on_request
+    thread = threading.Thread(target=server.serve_forever, name='stub-graph-server', daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    return server, base_url
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8099
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    error_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    server, base_url = start_stub_server(port, latency, error_rate)
+    print(f"নকল Graph API সার্ভার চলছে: {base_url}/v19.0/me/messages")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
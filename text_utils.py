@@ -0,0 +1,24 @@
+import re
+import unicodedata
+
+# বাংলা ও আরবি-ইন্ডিক অঙ্ককে ইংরেজি অঙ্কে রূপান্তর
+_DIGIT_MAP = str.maketrans('০১২৩৪৫৬৭৮৯٠١٢٣٤٥٦٧٨٩', '01234567890123456789')
+
+# শব্দের অংশ হিসেবে ধরা হবে এমন অক্ষর: \w ছাড়াও বাংলা ও আরবি ব্লকের কারচিহ্ন (া, ি, ু ইত্যাদি)
+WORD_CHARS = r'\wঀ-৿؀-ۿ'
+_TOKEN_RE = re.compile(f'[{WORD_CHARS}]+')
+_NON_WORD_RE = re.compile(f'[^{WORD_CHARS}\\s]+')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    # ছোট হাতের অক্ষর, অঙ্ক, যতিচিহ্ন ও স্পেস একরকম করা
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFC', text).lower().translate(_DIGIT_MAP)
+    text = _NON_WORD_RE.sub(' ', text)
+    return _SPACE_RE.sub(' ', text).strip()
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(normalize_text(text))
@@ -0,0 +1,255 @@
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+
+# --- ওয়েবহুক ইভেন্টের জন্য ব্যাকগ্রাউন্ড কিউ কনফিগারেশন ---
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '4'))
+WEBHOOK_DURABLE_QUEUE = os.getenv('WEBHOOK_DURABLE_QUEUE', '0') == '1'
+# ডিউরেবল মোডে একটি ইভেন্ট সর্বোচ্চ কতবার চেষ্টা হবে, তারপর 'failed' হিসেবে রেখে দেওয়া হবে
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', '3'))
+# এতক্ষণের পুরনো claim অন্য প্রসেস নিয়ে নিতে পারবে (আগের প্রসেস ক্র্যাশ করেছে ধরে নেওয়া হয়)
+WEBHOOK_CLAIM_LEASE = int(os.getenv('WEBHOOK_CLAIM_LEASE', '300'))
+# ব্যর্থ ইভেন্ট একই worker-এ এত সেকেন্ড (প্রতিবার দ্বিগুণ) পরে আবার চেষ্টা, তার আগে ওই গ্রাহকের পরের মেসেজ নয়
+WEBHOOK_RETRY_DELAY = float(os.getenv('WEBHOOK_RETRY_DELAY', '2'))
+WEBHOOK_RETRY_DELAY_MAX = 30
+# কিউ ভর্তি থাকায় ছেড়ে দেওয়া বা অন্য প্রসেসের ফেলে যাওয়া ইভেন্ট এত সেকেন্ড পরপর খোঁজা হয়
+WEBHOOK_RECOVERY_INTERVAL = float(os.getenv('WEBHOOK_RECOVERY_INTERVAL', '60'))
+# ----------------------------------------------------
+
+_shards = []
+_workers = []
+_handler = None
+_durable_collection = None
+# এই প্রসেসের কিউতে থাকা/চলমান ডিউরেবল ইভেন্ট, যাতে রিকভারি সেগুলো আবার কিউতে না তোলে
+_queued_ids = set()
+_recovery_thread = None
+_owner_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+_lock = threading.Lock()
+
+_stats = {
+    'enqueued': 0,
+    'processed': 0,
+    'dropped': 0,
+    'failed': 0,
+    'retried': 0,
+    'recovered': 0,
+    'stolen': 0,
+    'wait_time_total': 0.0,
+    'wait_time_max': 0.0,
+}
+
+
+def _shard_for(sender_id):
+    # একই sender_id সবসময় একই worker-এ যায়, তাই প্রতি গ্রাহকের মেসেজের ক্রম ঠিক থাকে
+    return _shards[zlib.crc32(str(sender_id).encode('utf-8')) % len(_shards)]
+
+
+def _renew_claim(queue_id):
+    # প্রসেস করার ঠিক আগে claim নবায়ন; অন্য প্রসেস lease পার হওয়ায় নিয়ে নিলে এখানে আর চালানো হবে না
+    result = _durable_collection.update_one(
+        {'_id': queue_id, 'claimed_by': _owner_id},
+        {'$set': {'claimed_at': datetime.utcnow()}})
+    return result.matched_count == 1
+
+
+def _finish_durable(queue_id, error):
+    # আবার চেষ্টা করতে হলে এ পর্যন্ত চেষ্টার সংখ্যা, নইলে None
+    if error is None:
+        _durable_collection.delete_one({'_id': queue_id, 'claimed_by': _owner_id})
+        return None
+    doc = _durable_collection.find_one_and_update(
+        {'_id': queue_id, 'claimed_by': _owner_id},
+        {'$inc': {'attempts': 1}, '$set': {'last_error': error}},
+        return_document=ReturnDocument.AFTER)
+    if doc is None:
+        return None
+    if doc['attempts'] >= WEBHOOK_MAX_ATTEMPTS:
+        # আর চেষ্টা নয়, তবে তদন্তের জন্য ডকুমেন্ট রেখে দেওয়া
+        _durable_collection.update_one({'_id': queue_id}, {'$set': {'failed': True, 'claimed_by': None}})
+        print(f"ইভেন্ট {queue_id} {doc['attempts']} বার ব্যর্থ, 'failed' হিসেবে রাখা হলো।")
+        return None
+    return doc['attempts']
+
+
+def _handle(item):
+    try:
+        _handler(item['event'])
+    except Exception as e:
+        print(f"কিউ থেকে ইভেন্ট প্রসেস করতে সমস্যা: {e}")
+        with _lock:
+            _stats['failed'] += 1
+        return str(e)
+    with _lock:
+        _stats['processed'] += 1
+    return None
+
+
+def _process(item):
+    queue_id = item.get('queue_id')
+    if queue_id is not None and not _renew_claim(queue_id):
+        with _lock:
+            _stats['stolen'] += 1
+        return
+    wait_time = time.monotonic() - item['enqueued_at']
+    with _lock:
+        _stats['wait_time_total'] += wait_time
+        if wait_time > _stats['wait_time_max']:
+            _stats['wait_time_max'] = wait_time
+    while True:
+        error = _handle(item)
+        if queue_id is None:
+            return
+        attempts = _finish_durable(queue_id, error)
+        if attempts is None:
+            return
+        # কিউয়ের শেষে নয়, এখানেই আবার চেষ্টা, যাতে একই গ্রাহকের পরের মেসেজ এর আগে না যায়
+        time.sleep(min(WEBHOOK_RETRY_DELAY_MAX, WEBHOOK_RETRY_DELAY * 2 ** (attempts - 1)))
+        if not _renew_claim(queue_id):
+            with _lock:
+                _stats['stolen'] += 1
+            return
+        with _lock:
+            _stats['retried'] += 1
+
+
+def _worker_loop(shard):
+    while True:
+        item = shard.get()
+        try:
+            _process(item)
+        except Exception as e:
+            print(f"ডিউরেবল কিউতে ইভেন্টের অবস্থা লিখতে সমস্যা: {e}")
+        finally:
+            if item.get('queue_id') is not None:
+                with _lock:
+                    _queued_ids.discard(item['queue_id'])
+            shard.task_done()
+
+
+def start_workers(handler, durable_collection=None):
+    global _handler, _durable_collection, _recovery_thread
+    if _workers:
+        return
+    _handler = handler
+    if WEBHOOK_DURABLE_QUEUE:
+        _durable_collection = durable_collection
+    worker_count = max(1, WEBHOOK_WORKERS)
+    shard_size = max(1, WEBHOOK_QUEUE_SIZE // worker_count)
+    for i in range(worker_count):
+        shard = queue.Queue(maxsize=shard_size)
+        _shards.append(shard)
+        worker = threading.Thread(target=_worker_loop, args=(shard,), name=f'webhook-worker-{i}', daemon=True)
+        worker.start()
+        _workers.append(worker)
+    if _durable_collection is not None:
+        _recovery_thread = threading.Thread(target=_recovery_loop, name='webhook-recovery', daemon=True)
+        _recovery_thread.start()
+    print(f"{worker_count}টি webhook worker চালু হয়েছে (কিউ সাইজ: {WEBHOOK_QUEUE_SIZE})।")
+
+
+def _recover_filter():
+    # কেউ claim করেনি, অথবা claim-এর lease পার হয়ে গেছে (সেই প্রসেস ক্র্যাশ করেছে); চালু প্রসেসের ইভেন্টে হাত নয়
+    stale_cutoff = datetime.utcnow() - timedelta(seconds=WEBHOOK_CLAIM_LEASE)
+    recover_filter = {
+        'failed': {'$ne': True},
+        '$or': [{'claimed_by': None}, {'claimed_at': {'$lt': stale_cutoff}}],
+    }
+    with _lock:
+        if _queued_ids:
+            recover_filter['_id'] = {'$nin': list(_queued_ids)}
+    return recover_filter
+
+
+def _recovery_loop():
+    # চালুর সময় একবার, তারপর নিয়মিত; রিস্টার্টের অপেক্ষায় থাকতে হয় না
+    while True:
+        _recover_pending()
+        time.sleep(WEBHOOK_RECOVERY_INTERVAL)
+
+
+def _recover_pending():
+    # আগের প্রসেস ক্র্যাশ করলে ডিউরেবল কিউতে থাকা ইভেন্টগুলো atomically claim করে আবার কিউতে তোলা
+    if _durable_collection is None:
+        return
+    try:
+        while True:
+            doc = _durable_collection.find_one_and_update(
+                _recover_filter(),
+                {'$set': {'claimed_by': _owner_id, 'claimed_at': datetime.utcnow()}},
+                sort=[('created_at', 1)],
+                return_document=ReturnDocument.AFTER)
+            if doc is None:
+                break
+            if not _put(doc['event'], doc.get('sender_id'), doc['_id']):
+                _durable_collection.update_one({'_id': doc['_id']}, {'$set': {'claimed_by': None, 'claimed_at': None}})
+                break
+            with _lock:
+                _stats['recovered'] += 1
+    except Exception as e:
+        print(f"ডিউরেবল কিউ রিকভার করতে সমস্যা: {e}")
+
+
+def _put(event, sender_id, queue_id=None):
+    item = {'event': event, 'enqueued_at': time.monotonic(), 'queue_id': queue_id}
+    if queue_id is not None:
+        # কিউতে তোলার আগেই, নইলে worker শেষ করে ফেলার পরে যোগ হয়ে থেকে যেতে পারে
+        with _lock:
+            _queued_ids.add(queue_id)
+    try:
+        _shard_for(sender_id).put_nowait(item)
+    except queue.Full:
+        with _lock:
+            _stats['dropped'] += 1
+            _queued_ids.discard(queue_id)
+        # ডিউরেবল কিউতে থাকলে পরের রিকভারিতে আবার চেষ্টা হবে, তাই ডকুমেন্ট রেখে দেওয়া হচ্ছে
+        return False
+    with _lock:
+        _stats['enqueued'] += 1
+    return True
+
+
+def enqueue_event(messaging_event):
+    sender_id = messaging_event.get('sender', {}).get('id')
+    queue_id = None
+    if _durable_collection is not None:
+        try:
+            queue_id = _durable_collection.insert_one({
+                'sender_id': sender_id,
+                'event': messaging_event,
+                'created_at': datetime.utcnow(),
+                # যে প্রসেস ওয়েবহুক পেয়েছে সে-ই প্রথমে মালিক
+                'claimed_by': _owner_id,
+                'claimed_at': datetime.utcnow(),
+                'attempts': 0,
+            }).inserted_id
+        except Exception as e:
+            print(f"ডিউরেবল কিউতে ইভেন্ট সেভ করতে সমস্যা: {e}")
+    if _put(messaging_event, sender_id, queue_id):
+        return True
+    if queue_id is not None:
+        # কিউ ভর্তি: claim ছেড়ে দেওয়া, পরের রিকভারি সুইপ এটা নেবে
+        try:
+            _durable_collection.update_one({'_id': queue_id}, {'$set': {'claimed_by': None, 'claimed_at': None}})
+        except Exception as e:
+            print(f"ডিউরেবল কিউতে claim ছাড়তে সমস্যা: {e}")
+    return False
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+    stats['workers'] = len(_workers)
+    stats['depth'] = sum(shard.qsize() for shard in _shards)
+    stats['capacity'] = sum(shard.maxsize for shard in _shards)
+    stats['durable'] = _durable_collection is not None
+    handled = stats['processed'] + stats['failed']
+    stats['wait_time_avg'] = stats['wait_time_total'] / handled if handled else 0.0
+    return stats